@@ -0,0 +1,295 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import logging
+import os
+import re
+import shutil
+from datetime import datetime
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Optimized variants are written to this subfolder of the dated folder; send_email
+# attaches them in place of the originals, which stay untouched for Google Drive
+OPTIMIZED_DIR = 'optimized'
+
+# Worker processes used to optimize files
+optimize_workers = int(os.getenv('OPTIMIZE_WORKERS', str(os.cpu_count() or 1)))
+
+# Defaults for the optimization profiles below
+pdf_image_dpi = int(os.getenv('OPTIMIZE_PDF_DPI', '150'))
+jpeg_quality = int(os.getenv('OPTIMIZE_JPEG_QUALITY', '80'))
+max_image_side = int(os.getenv('OPTIMIZE_MAX_IMAGE_SIDE', '2000'))
+
+# Optimization profiles, named by the 'optimize' key of the file configurations
+# and highlights patterns in telegram_downloader.channels; files whose
+# configuration has no 'optimize' key are emailed as downloaded
+profiles = {
+    'pdf': {'dpi': pdf_image_dpi, 'quality': jpeg_quality},
+    'image': {'quality': jpeg_quality, 'max_side': max_image_side},
+}
+
+def profile_for(file_name, confs):
+    """
+    Return the optimization profile of the configuration a file name matches.
+
+    Args:
+        file_name: Name of a downloaded file
+        confs: File configurations and highlights patterns, whose target_format
+               the name is matched against and whose 'optimize' key names a profile
+
+    Returns:
+        Profile dict, or None if the file isn't optimized
+    """
+    for conf in confs:
+        if not conf.get('optimize'):
+            continue
+        pattern = re.escape(conf['target_format']).replace(re.escape('{date}'), r'.+')
+        if re.fullmatch(pattern, file_name):
+            return profiles[conf['optimize']]
+    return None
+
+def optimized_path(file_path):
+    """Return where the optimized variant of file_path is written."""
+    return os.path.join(os.path.dirname(file_path), OPTIMIZED_DIR, os.path.basename(file_path))
+
+def encode_jpeg(image, quality):
+    """Encode a PIL image as an optimized, progressive JPEG and return the bytes."""
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def optimize_jpeg(source, destination, quality, max_side):
+    """
+    Re-encode a JPEG at the given quality, no larger than max_side pixels.
+
+    Args:
+        source: Path of the original image
+        destination: Path to write the re-encoded image to
+        quality: JPEG quality (1-95)
+        max_side: Longest side of the result, in pixels
+    """
+    with Image.open(source) as image:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        data = encode_jpeg(image, quality)
+    with open(destination, 'wb') as f:
+        f.write(data)
+
+def downsample_pdf_images(pdf, dpi, quality):
+    """
+    Downsample the images of a PDF that exceed dpi at the size of their page.
+
+    Only 8-bit RGB and grayscale images without a soft mask are rewritten;
+    anything else is left as it is.
+
+    Args:
+        pdf: Open pikepdf.Pdf
+        dpi: Target resolution
+        quality: JPEG quality of the rewritten images
+
+    Returns:
+        Number of images rewritten
+    """
+    rewritten = 0
+    seen = set()
+    for page in pdf.pages:
+        page_width = float(page.mediabox[2]) - float(page.mediabox[0])
+        page_height = float(page.mediabox[3]) - float(page.mediabox[1])
+        # Pixels the image would need to cover the whole page at the target DPI
+        max_width = page_width / 72 * dpi
+        max_height = page_height / 72 * dpi
+
+        for raw_image in page.images.values():
+            if raw_image.objgen in seen:
+                continue
+            seen.add(raw_image.objgen)
+            if '/SMask' in raw_image or '/Mask' in raw_image:
+                continue
+
+            image = pikepdf.PdfImage(raw_image)
+            scale = min(max_width / image.width, max_height / image.height)
+            if scale >= 0.9 or image.bits_per_component != 8 or image.colorspace not in ('/DeviceRGB', '/DeviceGray'):
+                continue
+            try:
+                pil_image = image.as_pil_image()
+            except (NotImplementedError, pikepdf.PdfError):
+                continue
+
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            pil_image = pil_image.resize(size, Image.LANCZOS)
+            raw_image.write(encode_jpeg(pil_image, quality), filter=pikepdf.Name.DCTDecode)
+            raw_image.Width, raw_image.Height = size
+            raw_image.ColorSpace = pikepdf.Name.DeviceGray if pil_image.mode == 'L' else pikepdf.Name.DeviceRGB
+            raw_image.BitsPerComponent = 8
+            if '/DecodeParms' in raw_image:
+                del raw_image.DecodeParms
+            rewritten += 1
+    return rewritten
+
+def optimize_pdf(source, destination, dpi, quality):
+    """
+    Downsample, recompress and linearize a PDF.
+
+    Args:
+        source: Path of the original PDF
+        destination: Path to write the optimized PDF to
+        dpi: Resolution to downsample embedded images to
+        quality: JPEG quality of downsampled images
+    """
+    with pikepdf.open(source) as pdf:
+        downsample_pdf_images(pdf, dpi, quality)
+        pdf.remove_unreferenced_resources()
+        pdf.save(
+            destination,
+            linearize=True,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate
+        )
+
+def stitch_images(image_paths, destination):
+    """
+    Combine images into a PDF with one page per image, in the given order.
+
+    Args:
+        image_paths: Paths of the images
+        destination: Path to write the PDF to
+    """
+    images = [Image.open(path) for path in image_paths]
+    try:
+        pages = [image if image.mode in ('RGB', 'L') else image.convert('RGB') for image in images]
+        partial = destination + '.part'
+        pages[0].save(partial, format='PDF', save_all=True, append_images=pages[1:], resolution=150)
+        os.replace(partial, destination)
+    finally:
+        for image in images:
+            image.close()
+
+def optimize_file(file_path, profile):
+    """
+    Write the optimized variant of a file, keeping it only if it is smaller.
+
+    Runs in a worker process.
+
+    Args:
+        file_path: Path of the original file
+        profile: Optimization profile from profiles
+
+    Returns:
+        Tuple of (original size, size of the file to email)
+    """
+    destination = optimized_path(file_path)
+    partial = destination + '.part'
+    if file_path.lower().endswith('.pdf'):
+        optimize_pdf(file_path, partial, profile.get('dpi', pdf_image_dpi), profile.get('quality', jpeg_quality))
+    else:
+        optimize_jpeg(file_path, partial, profile.get('quality', jpeg_quality), profile.get('max_side', max_image_side))
+
+    original_size = os.path.getsize(file_path)
+    optimized_size = os.path.getsize(partial)
+    if optimized_size >= original_size:
+        os.remove(partial)
+        return original_size, original_size
+    os.replace(partial, destination)
+    return original_size, optimized_size
+
+def prepare_output_dir(directory_path):
+    """
+    Empty the OPTIMIZED_DIR subfolder of a dated folder before optimizing into it.
+
+    Variants left over from an earlier run are dropped, in case their
+    originals changed.
+
+    Args:
+        directory_path: Path of the dated folder
+
+    Returns:
+        True if files can be optimized, False if pikepdf or Pillow is missing
+    """
+    if pikepdf is None or Image is None:
+        logger.warning("pikepdf and Pillow are required to optimize attachments; emailing originals")
+        return False
+    output_dir = os.path.join(directory_path, OPTIMIZED_DIR)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    return True
+
+def log_result(file_name, original_size, optimized_size):
+    """Log the outcome of optimize_file."""
+    logger.info(
+        f"Optimized {file_name}: {original_size / 1048576:.1f} MB -> {optimized_size / 1048576:.1f} MB"
+        if optimized_size < original_size else f"Kept {file_name}: optimizing did not make it smaller"
+    )
+
+def optimize_folder(directory_path, confs, workers=optimize_workers):
+    """
+    Write optimized variants of a dated folder's files for email delivery.
+
+    Files matching a configuration with an 'optimize' profile are optimized
+    on a process pool into the OPTIMIZED_DIR subfolder. Originals are never
+    modified.
+
+    Args:
+        directory_path: Path of the dated folder
+        confs: File configurations and highlights patterns (see profile_for)
+        workers: Number of worker processes
+
+    Returns:
+        Dict mapping file names to (original size, size of the file to email)
+    """
+    if not os.path.isdir(directory_path):
+        logger.error(f"Directory not found: {directory_path}")
+        return {}
+    if not prepare_output_dir(directory_path):
+        return {}
+
+    jobs = {}
+    for file_name in os.listdir(directory_path):
+        file_path = os.path.join(directory_path, file_name)
+        profile = profile_for(file_name, confs)
+        if profile and os.path.isfile(file_path):
+            jobs[file_name] = (file_path, profile)
+
+    results = {}
+    if not jobs:
+        return results
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+        futures = {executor.submit(optimize_file, *job): file_name for file_name, job in jobs.items()}
+        for future in as_completed(futures):
+            file_name = futures[future]
+            try:
+                results[file_name] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to optimize {file_name}, emailing the original: {e}")
+                continue
+            log_result(file_name, *results[file_name])
+
+    before = sum(original for original, _ in results.values())
+    after = sum(optimized for _, optimized in results.values())
+    if before:
+        logger.info(f"Attachments reduced from {before / 1048576:.1f} MB to {after / 1048576:.1f} MB")
+    return results
+
+if __name__ == "__main__":
+    # Imported here: telegram_downloader imports this module
+    from telegram_downloader import channel_confs, channels
+
+    today_str = datetime.now().strftime('%d-%m-%Y')
+    confs = [conf for channel in channels for conf in channel_confs(channel)]
+    optimize_folder(os.path.join(os.getenv('GITHUB_WORKSPACE', '.'), today_str), confs)
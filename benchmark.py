@@ -0,0 +1,360 @@
+from collections import Counter
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Keep the downloader's dated folder, scan state and download cache out of the working tree
+_workspace = tempfile.mkdtemp(prefix='news_benchmark_')
+os.environ['GITHUB_WORKSPACE'] = _workspace
+os.environ.setdefault('SCAN_STATE_FILE', os.path.join(_workspace, '.scan_state.json'))
+os.environ.setdefault('DOWNLOAD_CACHE_DIR', os.path.join(_workspace, '.download_cache'))
+os.environ.setdefault('PEER_CACHE_FILE', os.path.join(_workspace, '.peer_cache.json'))
+
+from telethon import utils
+from telethon.tl.types import Channel, ChatPhotoEmpty, InputMessagesFilterDocument, InputMessagesFilterPhotos
+import telegram_downloader as td
+
+_real_sleep = asyncio.sleep
+
+
+class BenchStats:
+    """Counters collected while a scenario runs."""
+
+    def __init__(self):
+        self.rpcs = Counter()
+        self.messages = 0
+        self.bytes = 0
+        self.slept = 0.0
+
+    def report(self, wall_time, throttled):
+        return {
+            'wall_time': round(wall_time, 3),
+            'rpcs': sum(count for method, count in self.rpcs.items() if method != 'GetFileRequest'),
+            'file_requests': self.rpcs['GetFileRequest'],
+            'rpcs_by_method': dict(sorted(self.rpcs.items())),
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'slept': round(self.slept, 3),
+            'throttled': round(throttled, 3),
+        }
+
+
+class FakeFile:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+class FakeMedia:
+    def __init__(self, media_id):
+        self.id = media_id
+
+
+class FakeMessage:
+    """The parts of a Telethon Message the downloader reads."""
+
+    def __init__(self, message_id, date, text='', file_name=None, size=0, photo=False):
+        self.id = message_id
+        self.date = date
+        self.text = self.message = text
+        self.grouped_id = None
+        self.file = FakeFile(file_name, size) if size else None
+        self.document = FakeMedia(message_id) if size and not photo else None
+        self.photo = FakeMedia(message_id) if photo else None
+        self.media = self.document or self.photo
+
+
+class FakeUpdates:
+    def __init__(self, chats):
+        self.chats = chats
+
+
+class FakeUser:
+    username = 'benchmark'
+
+
+class FakeTelegramClient:
+    """
+    In-memory stand-in for the TelegramClient API used by telegram_downloader.
+
+    Every request costs `latency` seconds and passes through a RateLimiter,
+    like RateLimitedTelegramClient's requests; file downloads stream at
+    `bandwidth` bytes per second.
+    """
+
+    def __init__(self, histories, stats, latency=0.05, bandwidth=20 * 1024 * 1024, chunk_size=512 * 1024):
+        self.histories = histories
+        self.stats = stats
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.chunk_size = chunk_size
+        self.rate_limiter = td.RateLimiter()
+        self._by_id = {message.id: message for history in histories.values() for message in history}
+        self._entities = {
+            username: Channel(id=1000 + number, title=username, photo=ChatPhotoEmpty(), date=None, access_hash=number)
+            for number, username in enumerate(histories)
+        }
+        self._usernames = {utils.get_peer_id(entity): username for username, entity in self._entities.items()}
+
+    def _username(self, peer):
+        """Map a username, entity or cached input peer back to its channel."""
+        return peer if isinstance(peer, str) else self._usernames.get(utils.get_peer_id(peer))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def _rpc(self, method, key=None):
+        await self.rate_limiter.acquire(key)
+        self.stats.rpcs[method] += 1
+        await _real_sleep(self.latency)
+
+    async def __call__(self, request):
+        await self._rpc(type(request).__name__)
+        invite_hash = getattr(request, 'hash', None)
+        joined = [entity for username, entity in self._entities.items() if invite_hash and username.endswith(invite_hash)]
+        return FakeUpdates(joined)
+
+    async def get_me(self):
+        await self._rpc('GetUsersRequest')
+        return FakeUser()
+
+    async def get_entity(self, username):
+        await self._rpc('ResolveUsernameRequest', username)
+        return self._entities[username]
+
+    @staticmethod
+    def _search_matches(message, search, message_filter):
+        """Whether a message is a result of Telegram's search for every word of `search`."""
+        if isinstance(message_filter, InputMessagesFilterDocument) and not message.document:
+            return False
+        if isinstance(message_filter, InputMessagesFilterPhotos) and not message.photo:
+            return False
+        text = f"{message.text} {message.file.name if message.file else ''}".lower()
+        return all(word in text for word in (search or '').lower().split())
+
+    async def iter_messages(self, peer, limit=None, min_id=0, search=None, filter=None, **kwargs):
+        # Telegram returns history in pages of up to 100 messages
+        username = self._username(peer)
+        history = [message for message in self.histories.get(username, []) if message.id > min_id]
+        method = 'GetHistoryRequest'
+        if search or filter:
+            method = 'SearchRequest'
+            history = [message for message in history if self._search_matches(message, search, filter)]
+        if limit is not None:
+            history = history[:limit]
+        for start in range(0, max(len(history), 1), 100):
+            await self._rpc(method, username)
+            for message in history[start:start + 100]:
+                self.stats.messages += 1
+                yield message
+
+    async def get_messages(self, peer, ids=None, **kwargs):
+        await self._rpc('GetMessagesRequest', self._username(peer))
+        return [self._by_id.get(message_id) for message_id in ids or []]
+
+    async def _stream(self, size, offset=0):
+        while offset < size:
+            chunk = min(self.chunk_size, size - offset)
+            await _real_sleep(chunk / self.bandwidth)
+            self.stats.rpcs['GetFileRequest'] += 1
+            self.stats.bytes += chunk
+            offset += chunk
+            yield bytes(chunk)
+
+    async def iter_download(self, media, offset=0, **kwargs):
+        async for chunk in self._stream(self._by_id[media.id].file.size, offset):
+            yield chunk
+
+    async def download_media(self, message, file, progress_callback=None):
+        done = 0
+        async for chunk in self._stream(message.file.size):
+            file.write(chunk)
+            done += len(chunk)
+            if progress_callback:
+                await progress_callback(done, message.file.size)
+        return file
+
+    def add_event_handler(self, *args, **kwargs):
+        pass
+
+    def remove_event_handler(self, *args, **kwargs):
+        pass
+
+
+def build_histories(args, day):
+    """
+    Generate every configured channel's history, newest message first.
+
+    Today's files are placed among the newest `target_depth` messages; the
+    rest of each channel is earlier editions of the same files, unrelated
+    documents and, for `noise_ratio` of the messages, text-only chatter.
+    Messages are posted 10 minutes apart, the newest at `day`.
+    """
+    rng = random.Random(args.seed)
+    file_size = int(args.file_size_mb * 1024 * 1024)
+    photo_size = int(args.photo_size_kb * 1024)
+    histories = {}
+    next_id = 1
+
+    for channel in td.channels:
+        highlights = channel['type'] == 'highlights'
+        confs = channel['patterns'] if highlights else td.channel_file_confs(channel)
+        template = 'text_pattern' if highlights else 'source_format'
+
+        def post(conf, post_day):
+            text = conf[template].format(date=post_day.strftime(conf['date_format']))
+            if highlights:
+                return {'text': text, 'size': photo_size, 'photo': True}
+            return {'file_name': text, 'size': file_size}
+
+        posts = []
+        for position in range(args.messages):
+            if rng.random() < args.noise_ratio:
+                posts.append({'text': f"Discussion message {position}"})
+            elif rng.random() < 0.5:
+                # An earlier day's edition of one of the channel's files
+                conf = rng.choice(confs)
+                posts.append(post(conf, day - timedelta(days=1 + position * 7 // max(args.messages, 1))))
+            elif highlights:
+                posts.append({'text': f"Editorial summary {position}", 'size': photo_size, 'photo': True})
+            else:
+                posts.append({'file_name': f"Monthly Magazine Part {position}.pdf", 'size': file_size})
+
+        for conf in confs:
+            posts.insert(rng.randrange(min(args.target_depth, len(posts)) + 1), post(conf, day))
+
+        history = []
+        for position, fields in enumerate(posts):
+            history.append(FakeMessage(next_id + len(posts) - position, day - timedelta(minutes=10 * position), **fields))
+        next_id += len(posts) + 1
+        histories[channel['username']] = history
+    return histories
+
+
+def reset_workspace():
+    """Remove downloaded files, scan state and cached downloads from the last scenario."""
+    for path in (td.dated_dir, td.download_cache_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(td.dated_dir, exist_ok=True)
+    if os.path.exists(td.scan_state_file):
+        os.remove(td.scan_state_file)
+    td.download_manifest.clear()
+
+
+def clear_peer_cache():
+    """Forget the peers resolved (and channels joined) by earlier scenarios."""
+    td.peer_cache.clear()
+    if os.path.exists(td.peer_cache_file):
+        os.remove(td.peer_cache_file)
+
+
+async def scenario_newspaper(client):
+    for channel in td.channels:
+        if channel['type'] == 'newspaper':
+            await td.check_newspaper_channel(client, channel)
+
+
+async def scenario_highlights(client):
+    for channel in td.channels:
+        if channel['type'] == 'highlights':
+            await td.check_highlights_channel(client, channel)
+
+
+async def scenario_main(client):
+    td.create_client = lambda: client
+    await td.main()
+
+
+SCENARIOS = {
+    'newspaper': scenario_newspaper,
+    'highlights': scenario_highlights,
+    'main': scenario_main,
+    # main() again after a run that joined and resolved every channel
+    'main_cached': scenario_main,
+}
+
+
+async def run_scenario(name, args):
+    """Run one scenario against a fresh fake backend and return its report."""
+    clear_peer_cache()
+    if name == 'main_cached':
+        await run_scenario('main', args)
+    reset_workspace()
+    stats = BenchStats()
+    client = FakeTelegramClient(
+        build_histories(args, datetime.now().astimezone()),
+        stats,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mbps * 1024 * 1024
+    )
+
+    async def counting_sleep(delay, *sleep_args, **sleep_kwargs):
+        stats.slept += delay
+        return await _real_sleep(delay, *sleep_args, **sleep_kwargs)
+
+    asyncio.sleep = counting_sleep
+    try:
+        started = time.monotonic()
+        await SCENARIOS[name](client)
+        wall_time = time.monotonic() - started
+    finally:
+        asyncio.sleep = _real_sleep
+
+    report = stats.report(wall_time, client.rate_limiter.throttled)
+    report['downloaded'] = sorted(os.listdir(td.dated_dir))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark telegram_downloader against a simulated Telegram backend")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--messages', type=int, default=300, help="messages in each channel")
+    parser.add_argument('--noise-ratio', type=float, default=0.5, help="fraction of messages without a file")
+    parser.add_argument('--target-depth', type=int, default=20,
+                        help="today's files are posted among this many newest messages")
+    parser.add_argument('--latency-ms', type=float, default=50, help="latency of each Telegram request")
+    parser.add_argument('--bandwidth-mbps', type=float, default=20, help="download bandwidth in MB/s")
+    parser.add_argument('--file-size-mb', type=float, default=8, help="size of each newspaper PDF")
+    parser.add_argument('--photo-size-kb', type=float, default=400, help="size of each highlights image")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the generated channel histories")
+    parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    # The parallel engine needs real MTProto connections; the fake backend serves files through iter_download
+    td.download_engine = 'media'
+    td.logger.setLevel('WARNING')
+
+    reports = {}
+    try:
+        for name in args.scenarios:
+            reports[name] = asyncio.run(run_scenario(name, args))
+    finally:
+        shutil.rmtree(_workspace, ignore_errors=True)
+
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{'scenario':<12}{'wall (s)':>10}{'RPCs':>8}{'messages':>10}{'MB':>10}{'slept (s)':>11}{'throttled (s)':>15}{'files':>7}")
+    for name, report in reports.items():
+        print(f"{name:<12}{report['wall_time']:>10.2f}{report['rpcs']:>8}{report['messages']:>10}{report['bytes'] / 1048576:>10.1f}"
+              f"{report['slept']:>11.2f}{report['throttled']:>15.2f}{len(report['downloaded']):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import metrics
+from state_files import load_json, save_json_atomic
 import os
 import json
 import logging
+import random
+import threading
+import time
 from datetime import datetime
 
 # Configure logging
@@ -13,53 +21,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def setup_drive_service():
+# Upload concurrency and the number of retries, with exponential backoff,
+# for requests failing with 429 or 5xx responses
+upload_workers = int(os.getenv('DRIVE_UPLOAD_WORKERS', '4'))
+upload_retries = int(os.getenv('DRIVE_UPLOAD_RETRIES', '5'))
+
+# Extensions of the files that also get a Google Docs copy (empty disables conversion)
+gdoc_convert_extensions = {
+    ext.strip().lower().lstrip('.')
+    for ext in os.getenv('DRIVE_CONVERT_EXTENSIONS', 'txt,doc,docx,pdf,rtf,odt,jpg,jpeg,png').split(',')
+    if ext.strip()
+}
+
+# Folder name to ID mappings kept between runs
+folder_cache_file = os.getenv(
+    'DRIVE_FOLDER_CACHE_FILE',
+    os.path.join(os.getenv('GITHUB_WORKSPACE', '.'), '.drive_folders.json')
+)
+
+# Resumable upload sessions kept between runs, and the size of each uploaded chunk
+# (a multiple of 256 KB)
+upload_sessions_file = os.getenv(
+    'DRIVE_UPLOAD_SESSIONS_FILE',
+    os.path.join(os.getenv('GITHUB_WORKSPACE', '.'), '.drive_upload_sessions.json')
+)
+upload_chunk_size = max(1, int(os.getenv('DRIVE_UPLOAD_CHUNK_MB', '8'))) * 1024 * 1024
+
+# IDs of the files uploaded by the last run, read by send_email to link to them
+uploaded_files_file = os.getenv(
+    'DRIVE_UPLOADED_FILES_FILE',
+    os.path.join(os.getenv('GITHUB_WORKSPACE', '.'), '.drive_uploads.json')
+)
+
+# Drive accepts up to 100 calls in one batch request
+BATCH_LIMIT = 100
+
+_thread_local = threading.local()
+_folder_cache = None
+_checked_folders = set()
+_sessions = None
+_sessions_lock = threading.Lock()
+
+def load_drive_credentials():
+    """
+    Load service account credentials from the GOOGLE_DRIVE_CREDENTIALS environment variable.
+    
+    Returns:
+        Credentials object, or None if the variable is missing or invalid
+    """
+    # Get credentials from GitHub secrets (stored as environment variable)
+    credentials_json = os.environ.get('GOOGLE_DRIVE_CREDENTIALS')
+    
+    if not credentials_json:
+        logger.error("Google Drive credentials not found in environment variables")
+        print("ERROR: GOOGLE_DRIVE_CREDENTIALS environment variable is not set.")
+        print("Please set this variable with your Google service account JSON.")
+        return None
+        
+    # Parse credentials JSON from environment variable
+    try:
+        credentials_info = json.loads(credentials_json)
+    except json.JSONDecodeError:
+        logger.error("Invalid JSON format in GOOGLE_DRIVE_CREDENTIALS")
+        print("ERROR: The GOOGLE_DRIVE_CREDENTIALS value is not valid JSON.")
+        print("Make sure you've copied the entire JSON file contents correctly.")
+        return None
+        
+    # Validate required fields in the credentials
+    required_fields = ['client_email', 'private_key', 'type']
+    missing_fields = [field for field in required_fields if field not in credentials_info]
+    if missing_fields:
+        logger.error(f"Missing required fields in credentials: {missing_fields}")
+        print(f"ERROR: The service account JSON is missing required fields: {missing_fields}")
+        return None
+        
+    # Create credentials object
+    try:
+        return service_account.Credentials.from_service_account_info(
+            credentials_info,
+            scopes=['https://www.googleapis.com/auth/drive']
+        )
+    except Exception as e:
+        logger.error(f"Error creating credentials object: {e}")
+        print(f"ERROR: Failed to create credentials from service account JSON: {e}")
+        return None
+
+def setup_drive_service(credentials=None):
     """
     Set up and return Google Drive API service using service account credentials.
     
+    Args:
+        credentials: Credentials to use (optional, loaded from the environment by default)
+    
     Returns:
         Google Drive API service object
     """
     try:
-        # Get credentials from GitHub secrets (stored as environment variable)
-        credentials_json = os.environ.get('GOOGLE_DRIVE_CREDENTIALS')
-        
-        if not credentials_json:
-            logger.error("Google Drive credentials not found in environment variables")
-            print("ERROR: GOOGLE_DRIVE_CREDENTIALS environment variable is not set.")
-            print("Please set this variable with your Google service account JSON.")
-            return None
-            
-        # Parse credentials JSON from environment variable
-        try:
-            credentials_info = json.loads(credentials_json)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON format in GOOGLE_DRIVE_CREDENTIALS")
-            print("ERROR: The GOOGLE_DRIVE_CREDENTIALS value is not valid JSON.")
-            print("Make sure you've copied the entire JSON file contents correctly.")
-            return None
-            
-        # Validate required fields in the credentials
-        required_fields = ['client_email', 'private_key', 'type']
-        missing_fields = [field for field in required_fields if field not in credentials_info]
-        if missing_fields:
-            logger.error(f"Missing required fields in credentials: {missing_fields}")
-            print(f"ERROR: The service account JSON is missing required fields: {missing_fields}")
-            return None
-            
-        # Create credentials object
-        try:
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_info,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-        except Exception as e:
-            logger.error(f"Error creating credentials object: {e}")
-            print(f"ERROR: Failed to create credentials from service account JSON: {e}")
+        if credentials is None:
+            credentials = load_drive_credentials()
+        if not credentials:
             return None
         
         # Build the Drive service
-        service = build('drive', 'v3', credentials=credentials)
+        service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
         logger.info("Google Drive service initialized successfully")
         return service
         
@@ -67,92 +131,434 @@ def setup_drive_service():
         logger.error(f"Error setting up Google Drive service: {e}")
         return None
 
-def upload_file_to_drive(service, file_path, parent_folder_id=None):
+def thread_drive_service(credentials):
+    """
+    Return a Drive service owned by the calling thread.
+    
+    The HTTP object behind a service is not thread-safe, so every upload
+    worker builds its own service from the shared credentials.
+    
+    Args:
+        credentials: Service account credentials
+        
+    Returns:
+        Google Drive API service object for this thread
+    """
+    service = getattr(_thread_local, 'service', None)
+    if service is None:
+        service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        _thread_local.service = service
+    return service
+
+def file_md5(file_path):
+    """
+    Compute the MD5 checksum of a file, reading it in chunks.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        Hex digest, comparable to Drive's md5Checksum
+    """
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def list_folder_files(service, folder_id):
+    """
+    List the files already in a Google Drive folder.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_id: ID of the folder
+        
+    Returns:
+        Dict mapping file names to {'id', 'md5Checksum'} (checksum absent for Google Docs)
+    """
+    files = {}
+    page_token = None
+    while True:
+        result = service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields='nextPageToken, files(id, name, md5Checksum)',
+            pageSize=1000,
+            pageToken=page_token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute(num_retries=upload_retries)
+        for item in result.get('files', []):
+            files.setdefault(item['name'], item)
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return files
+
+def _upload_sessions():
+    """Return the saved resumable upload sessions, loading them on first use."""
+    global _sessions
+    if _sessions is None:
+        _sessions = load_json(upload_sessions_file, 'upload sessions')
+    return _sessions
+
+def _update_upload_session(key, session=None):
+    """Save (or, with session=None, forget) the resumable session of an upload."""
+    with _sessions_lock:
+        sessions = _upload_sessions()
+        if session:
+            sessions[key] = session
+        else:
+            sessions.pop(key, None)
+        save_json_atomic(sessions, upload_sessions_file, 'upload sessions')
+
+def _delete_stale_gdoc(service, file_name, existing_files):
+    """Delete the Google Doc copy of a file whose content was replaced."""
+    stale = existing_files.pop(f"{file_name}_gdoc", None)
+    if not stale:
+        return
+    try:
+        service.files().delete(fileId=stale['id'], supportsAllDrives=True).execute(num_retries=upload_retries)
+        logger.info(f"Deleted the outdated Google Doc of {file_name}")
+    except HttpError as e:
+        logger.warning(f"Could not delete the outdated Google Doc of {file_name}: {e}")
+
+def upload_file_to_drive(service, file_path, parent_folder_id=None, existing_files=None):
     """
     Upload a file to Google Drive.
     
+    The upload is skipped when existing_files holds a file with the same name
+    and MD5 checksum. A file with the same name but different content is
+    updated in place, keeping its ID; its now stale Google Doc copy is deleted
+    and dropped from existing_files, so it is converted again. The content is
+    sent in chunks of upload_chunk_size, and its resumable session URI is
+    saved, so an interrupted upload continues from the offset the server
+    acknowledged, even in a later process.
+    
     Args:
         service: Google Drive API service instance
         file_path: Path to the file to upload
         parent_folder_id: ID of the parent folder in Google Drive (optional)
+        existing_files: Files already in the parent folder, from list_folder_files (optional)
         
     Returns:
         File ID if successful, None otherwise
     """
     try:
         file_name = os.path.basename(file_path)
+        md5 = file_md5(file_path)
+        size = os.path.getsize(file_path)
+        
+        # Skip files Drive already has with identical content
+        existing = (existing_files or {}).get(file_name)
+        if existing and existing.get('md5Checksum') == md5:
+            logger.info(f"Skipping {file_name}: already in Google Drive with ID: {existing['id']}")
+            metrics.inc('drive_uploads', result='skipped')
+            return existing['id']
         
         # File metadata
         file_metadata = {'name': file_name}
         
-        # If parent folder specified, add to metadata
-        if parent_folder_id:
+        # If parent folder specified, add to metadata (an update keeps the file where it is)
+        if parent_folder_id and not existing:
             file_metadata['parents'] = [parent_folder_id]
         
-        # Create media object
-        media = MediaFileUpload(
-            file_path,
-            resumable=True
-        )
+        file_id = existing['id'] if existing else None
+        session_key = f"{parent_folder_id or 'root'}/{file_name}"
+        session = _upload_sessions().get(session_key)
+        if session and (session.get('md5'), session.get('size'), session.get('file_id')) != (md5, size, file_id):
+            session = None
         
-        # Upload file
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        started = time.monotonic()
+        response = None
+        while response is None:
+            # Create media object
+            media = MediaFileUpload(
+                file_path,
+                chunksize=upload_chunk_size,
+                resumable=True
+            )
+            if file_id:
+                request = service.files().update(
+                    fileId=file_id,
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                )
+            else:
+                request = service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                )
+            if session:
+                # Ask the server how much it has, then continue from there
+                request.resumable_uri = session['uri']
+                request._in_error_state = True
+                logger.info(f"Resuming upload of {file_name}")
+            
+            try:
+                # Upload file
+                while response is None:
+                    status, response = request.next_chunk(num_retries=upload_retries)
+                    if request.resumable_uri and not session:
+                        session = {'uri': request.resumable_uri, 'md5': md5, 'size': size, 'file_id': file_id}
+                        _update_upload_session(session_key, session)
+                    if status:
+                        logger.info(f"Uploading {file_name}: {status.progress() * 100:.0f}%")
+            except HttpError as e:
+                if not session or e.resp.status not in (404, 410):
+                    raise
+                # The saved session has expired; start a new one
+                logger.warning(f"Upload session for {file_name} expired, starting over")
+                _update_upload_session(session_key)
+                session = None
         
-        file_id = file.get('id')
-        logger.info(f"Uploaded {file_name} to Google Drive with ID: {file_id}")
+        _update_upload_session(session_key)
+        file_id = response.get('id')
+        elapsed = max(time.monotonic() - started, 1e-6)
+        action = 'Updated' if existing else 'Uploaded'
+        logger.info(f"{action} {file_name} {'in' if existing else 'to'} Google Drive with ID: {file_id} ({size / 1048576 / elapsed:.2f} MB/s)")
+        if existing:
+            _delete_stale_gdoc(service, file_name, existing_files)
+        metrics.inc('drive_uploads', result='uploaded')
+        metrics.inc('drive_upload_bytes', size)
+        metrics.observe('drive_upload_seconds', elapsed)
+        metrics.observe('drive_upload_mbps', size / 1048576 / elapsed, metrics.MBPS_BUCKETS)
         return file_id
         
     except Exception as e:
         logger.error(f"Error uploading {os.path.basename(file_path)} to Google Drive: {e}")
+        metrics.inc('drive_uploads', result='failed')
+        return None
+
+def gdoc_mime_type(file_name):
+    """
+    Return the Google Apps mimeType a file should be converted to.
+    
+    Args:
+        file_name: Name of the file
+        
+    Returns:
+        Target mimeType, or None if files of this type are not converted
+    """
+    ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+    if ext not in gdoc_convert_extensions:
         return None
+    # Documents are imported as text; Google will OCR images and PDFs
+    return 'application/vnd.google-apps.document'
 
-def upload_file_as_gdoc(service, file_path, parent_folder_id=None):
+def _is_retryable(error):
+    """Return True for errors worth retrying: rate limits, server errors and transport failures."""
+    if not isinstance(error, HttpError):
+        return True
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    return status == 403 and 'ateLimitExceeded' in str(error)
+
+def execute_batch(service, requests, retries=upload_retries):
     """
-    Upload a file to Google Drive and request conversion to Google Docs format.
+    Execute metadata-only Drive requests in batches.
+    
+    Requests are sent BATCH_LIMIT at a time in a single HTTP round-trip each.
+    Items failing with a retryable error are retried on their own, with
+    exponential backoff; the other items are not sent again.
+    
     Args:
         service: Google Drive API service instance
-        file_path: Path to the file to upload
+        requests: Dict mapping string keys to callables that build the HttpRequest
+        retries: Number of retries for failed items (optional)
+        
+    Returns:
+        (results, errors) dicts keyed like requests
+    """
+    results = {}
+    errors = {}
+    pending = dict(requests)
+    
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt, 32) + random.random())
+        failed = {}
+        
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                errors.pop(request_id, None)
+            else:
+                errors[request_id] = exception
+                if _is_retryable(exception):
+                    failed[request_id] = pending[request_id]
+        
+        keys = list(pending)
+        for start in range(0, len(keys), BATCH_LIMIT):
+            chunk = keys[start:start + BATCH_LIMIT]
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(pending[key](), request_id=key)
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole round-trip failed; retry every item that has no answer yet
+                for key in chunk:
+                    if key not in results and key not in errors:
+                        errors[key] = e
+                        failed[key] = pending[key]
+        
+        pending = failed
+        if not pending:
+            break
+        logger.warning(f"Retrying {len(pending)} failed batch requests")
+    
+    return results, errors
+
+def convert_files_to_gdocs(service, files, parent_folder_id=None):
+    """
+    Create Google Docs copies of files already uploaded to Google Drive.
+    
+    The conversions happen server-side with files().copy, sent as one batch,
+    so the files' bytes are not uploaded a second time.
+    
+    Args:
+        service: Google Drive API service instance
+        files: List of (file_id, file_name) of the uploaded originals
         parent_folder_id: ID of the parent folder in Google Drive (optional)
+        
     Returns:
-        File ID if successful, None otherwise
+        Dict mapping original file names to the IDs of their Google Docs
     """
-    try:
-        file_name = os.path.basename(file_path)
-        ext = os.path.splitext(file_name)[1].lower()
-        # Map extensions to Google Docs mimeTypes
-        if ext in ['.txt', '.doc', '.docx', '.pdf', '.rtf', '.odt']:
-            gdoc_mime = 'application/vnd.google-apps.document'
-        elif ext in ['.jpg', '.jpeg', '.png']:
-            gdoc_mime = 'application/vnd.google-apps.document'  # Google will OCR images
-        else:
-            return None  # Skip unsupported types for conversion
-        file_metadata = {'name': file_name + '_gdoc', 'mimeType': gdoc_mime}
+    def copy(file_id, file_name):
+        file_metadata = {'name': file_name + '_gdoc', 'mimeType': gdoc_mime_type(file_name)}
         if parent_folder_id:
             file_metadata['parents'] = [parent_folder_id]
-        media = MediaFileUpload(file_path, resumable=True)
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
+        return lambda: service.files().copy(fileId=file_id, body=file_metadata, fields='id')
+    
+    # Skip types not configured for conversion
+    requests = {file_name: copy(file_id, file_name) for file_id, file_name in files if gdoc_mime_type(file_name)}
+    results, errors = execute_batch(service, requests)
+    for file_name, error in errors.items():
+        logger.error(f"Error converting {file_name} to a Google Doc: {error}")
+    for file_name, result in results.items():
+        logger.info(f"Converted {file_name} to a Google Doc with ID: {result.get('id')}")
+    return {file_name: result.get('id') for file_name, result in results.items()}
+
+def grant_permissions(service, file_ids, emails, role='reader'):
+    """
+    Share several files with several people in one batch.
+    
+    No notification is sent, which Drive refuses for addresses without a
+    Google account; those addresses are left out of the result.
+    
+    Args:
+        service: Google Drive API service instance
+        file_ids: IDs of the files to share
+        emails: Email addresses to grant access to
+        role: Drive permission role (optional, defaults to reader)
+        
+    Returns:
+        Set of the addresses granted access to every file
+    """
+    requests = {
+        f"{file_id}:{email}": (lambda file_id=file_id, email=email: service.permissions().create(
+            fileId=file_id,
+            body={'type': 'user', 'role': role, 'emailAddress': email},
+            sendNotificationEmail=False,
+            supportsAllDrives=True,
             fields='id'
-        ).execute()
-        file_id = file.get('id')
-        logger.info(f"Uploaded {file_name} as Google Doc to Drive with ID: {file_id}")
-        return file_id
-    except Exception as e:
-        logger.error(f"Error uploading {os.path.basename(file_path)} as Google Doc: {e}")
-        return None
+        ))
+        for file_id in file_ids
+        for email in emails
+    }
+    results, errors = execute_batch(service, requests)
+    for key, error in errors.items():
+        logger.error(f"Error granting {role} access ({key}): {error}")
+    return {email for email in emails if all(f"{file_id}:{email}" in results for file_id in file_ids)}
+
+def load_folder_cache(path=None):
+    """
+    Load the folder name to ID mappings saved by previous runs.
+    
+    Args:
+        path: Path of the cache file (optional, defaults to folder_cache_file)
+        
+    Returns:
+        Dict mapping '<parent ID>/<folder name>' to folder IDs
+    """
+    return load_json(path or folder_cache_file, 'folder cache')
+
+def save_folder_cache(cache, path=None):
+    """
+    Save the folder name to ID mappings for the next run.
+    
+    Args:
+        cache: Dict mapping '<parent ID>/<folder name>' to folder IDs
+        path: Path of the cache file (optional, defaults to folder_cache_file)
+    """
+    save_json_atomic(cache, path or folder_cache_file, 'folder cache')
+
+def _folder_query(folder_name, parent_folder_id=None):
+    """Build the Drive search query for a folder name inside a parent folder."""
+    escaped_name = folder_name.replace('\\', '\\\\').replace("'", "\\'")
+    return (
+        f"name = '{escaped_name}' and mimeType = 'application/vnd.google-apps.folder' "
+        f"and '{parent_folder_id or 'root'}' in parents and trashed = false"
+    )
+
+def find_folder(service, folder_name, parent_folder_id=None):
+    """
+    Look up an existing folder by name inside a parent folder.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_name: Name of the folder
+        parent_folder_id: ID of the parent folder in Google Drive (optional, defaults to root)
+        
+    Returns:
+        Folder ID if found, None otherwise
+    """
+    result = service.files().list(
+        q=_folder_query(folder_name, parent_folder_id),
+        fields='files(id)',
+        pageSize=1,
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True
+    ).execute(num_retries=upload_retries)
+    files = result.get('files', [])
+    return files[0]['id'] if files else None
+
+def folder_exists(service, folder_id):
+    """
+    Check that a folder ID still refers to a folder outside the trash.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_id: ID of the folder
+        
+    Returns:
+        False if Drive answers 404 or the folder is trashed, True otherwise
+        (other errors are left for the calls that use the folder to report)
+    """
+    try:
+        folder = service.files().get(
+            fileId=folder_id,
+            fields='id, trashed',
+            supportsAllDrives=True
+        ).execute(num_retries=upload_retries)
+        return not folder.get('trashed')
+    except HttpError as e:
+        if e.resp.status == 404:
+            return False
+        logger.warning(f"Could not check folder {folder_id} in Google Drive: {e}")
+        return True
 
-def create_dated_folder(service, folder_name):
+def create_dated_folder(service, folder_name, parent_folder_id=None):
     """
     Create a folder in Google Drive with the specified name.
     
     Args:
         service: Google Drive API service instance
         folder_name: Name of the folder to create
+        parent_folder_id: ID of the parent folder in Google Drive (optional, defaults to root)
         
     Returns:
         Folder ID if successful, None otherwise
@@ -163,10 +569,15 @@ def create_dated_folder(service, folder_name):
             'mimeType': 'application/vnd.google-apps.folder'
         }
         
+        # Create the folder directly inside its parent
+        if parent_folder_id:
+            folder_metadata['parents'] = [parent_folder_id]
+        
         folder = service.files().create(
             body=folder_metadata,
-            fields='id'
-        ).execute()
+            fields='id',
+            supportsAllDrives=True
+        ).execute(num_retries=upload_retries)
         
         folder_id = folder.get('id')
         logger.info(f"Created dated folder '{folder_name}' in Google Drive with ID: {folder_id}")
@@ -176,7 +587,185 @@ def create_dated_folder(service, folder_name):
         logger.error(f"Error creating folder {folder_name} in Google Drive: {e}")
         return None
 
-def upload_files_to_drive(directory_path, parent_folder_id=None, file_filter=None):
+def resolve_folder(service, folder_name, parent_folder_id=None, create=True):
+    """
+    Return the ID of a folder, reusing an existing one before creating it.
+    
+    Resolved IDs are cached in memory and in folder_cache_file, so repeated
+    runs on the same day reuse the folder after a single lookup by ID. A
+    cached folder Drive no longer has (404, or trashed) is forgotten and
+    resolved again.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_name: Name of the folder
+        parent_folder_id: ID of the parent folder in Google Drive (optional, defaults to root)
+        create: Whether to create the folder if it doesn't exist (optional, defaults to True)
+        
+    Returns:
+        Folder ID if successful, None otherwise
+    """
+    global _folder_cache
+    if _folder_cache is None:
+        _folder_cache = load_folder_cache()
+    
+    cache_key = f"{parent_folder_id or 'root'}/{folder_name}"
+    folder_id = _folder_cache.get(cache_key)
+    if folder_id and folder_id not in _checked_folders:
+        if folder_exists(service, folder_id):
+            _checked_folders.add(folder_id)
+        else:
+            logger.warning(f"Cached folder '{folder_name}' ({folder_id}) is gone from Google Drive, resolving it again")
+            del _folder_cache[cache_key]
+            save_folder_cache(_folder_cache)
+            folder_id = None
+    if folder_id:
+        logger.info(f"Reusing cached folder '{folder_name}' with ID: {folder_id}")
+        return folder_id
+    
+    try:
+        folder_id = find_folder(service, folder_name, parent_folder_id)
+        if folder_id:
+            logger.info(f"Found existing folder '{folder_name}' in Google Drive with ID: {folder_id}")
+    except Exception as e:
+        logger.error(f"Error looking up folder {folder_name} in Google Drive: {e}")
+    
+    if not folder_id and create:
+        folder_id = create_dated_folder(service, folder_name, parent_folder_id)
+    
+    if folder_id:
+        _checked_folders.add(folder_id)
+        _folder_cache[cache_key] = folder_id
+        save_folder_cache(_folder_cache)
+    return folder_id
+
+def save_uploaded_files(folder_name, folder_id, files, path=None):
+    """
+    Record the IDs of the files uploaded to a dated folder.
+    
+    Args:
+        folder_name: Name of the dated folder
+        folder_id: ID of the dated folder
+        files: Dict mapping file names to file IDs
+        path: Path of the record (optional, defaults to uploaded_files_file)
+    """
+    save_json_atomic({'folder': folder_name, 'folder_id': folder_id, 'files': files},
+                     path or uploaded_files_file, 'uploaded file IDs')
+
+def uploaded_file_ids(service, folder_name, file_names, parent_folder_id=None):
+    """
+    Find the Drive IDs of files uploaded to a dated folder.
+    
+    IDs recorded by the upload step are used first; any other file is looked
+    up by listing the folder, which is never created here.
+    
+    Args:
+        service: Google Drive API service instance
+        folder_name: Name of the dated folder
+        file_names: Names of the files to find
+        parent_folder_id: ID of the parent folder in Google Drive (optional, defaults to root)
+        
+    Returns:
+        Dict mapping the names of the files found to their IDs
+    """
+    ids = {}
+    uploaded = load_json(uploaded_files_file, 'uploaded file IDs')
+    if uploaded.get('folder') == folder_name:
+        ids = {name: file_id for name, file_id in uploaded.get('files', {}).items() if name in file_names}
+    
+    missing = [name for name in file_names if name not in ids]
+    if missing:
+        folder_id = resolve_folder(service, folder_name, parent_folder_id, create=False)
+        if folder_id:
+            try:
+                existing_files = list_folder_files(service, folder_id)
+                ids.update({name: existing_files[name]['id'] for name in missing if name in existing_files})
+            except Exception as e:
+                logger.error(f"Error listing files in folder '{folder_name}': {e}")
+    return ids
+
+class FolderUploader:
+    """
+    Upload files into today's Drive folder on a bounded pool of threads.
+    
+    Files can be submitted one at a time as they become available. The IDs
+    of uploaded files are recorded in uploaded_files_file as each upload
+    completes, and finish() makes the Google Docs copies in one batch.
+    """
+    
+    def __init__(self, parent_folder_id=None, folder_name=None, workers=upload_workers):
+        self.folder_name = folder_name or datetime.now().strftime('%d-%m-%Y')
+        self.credentials = load_drive_credentials()
+        self.service = setup_drive_service(self.credentials)
+        self.folder_id = None
+        self.existing_files = {}
+        self.uploaded = {}
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        if not self.service:
+            return
+        
+        # Reuse today's folder inside parent_folder_id (or the root) if it already exists
+        self.folder_id = resolve_folder(self.service, self.folder_name, parent_folder_id)
+        if not self.folder_id:
+            return
+        
+        # One listing of the folder lets files with matching checksums be skipped
+        try:
+            self.existing_files = list_folder_files(self.service, self.folder_id)
+        except Exception as e:
+            logger.error(f"Error listing files in folder '{self.folder_name}': {e}")
+    
+    def submit(self, file_path):
+        """
+        Queue a file for upload.
+        
+        Returns:
+            Future resolving to the file's ID (None on failure), or None if
+            there is no folder to upload to
+        """
+        if not self.folder_id:
+            return None
+        if file_path not in self._futures:
+            self._futures[file_path] = self._executor.submit(self._upload, file_path)
+        return self._futures[file_path]
+    
+    def _upload(self, file_path):
+        file_id = upload_file_to_drive(
+            thread_drive_service(self.credentials), file_path, self.folder_id, self.existing_files
+        )
+        if file_id:
+            with self._lock:
+                self.uploaded[os.path.basename(file_path)] = file_id
+                save_uploaded_files(self.folder_name, self.folder_id, self.uploaded)
+        return file_id
+    
+    def finish(self):
+        """
+        Wait for every submitted upload, then make the Google Docs copies.
+        
+        Returns:
+            Number of files successfully uploaded
+        """
+        to_convert = []
+        for future in as_completed(self._futures.values()):
+            future.result()
+        self._executor.shutdown()
+        
+        for file_name, file_id in self.uploaded.items():
+            unchanged = self.existing_files.get(file_name, {}).get('id') == file_id
+            if unchanged and f"{file_name}_gdoc" in self.existing_files:
+                continue  # The original was skipped and its Google Doc already exists
+            to_convert.append((file_id, file_name))
+        
+        # Then make every Google Doc copy in one batch
+        gdoc_uploads = len(convert_files_to_gdocs(self.service, to_convert, self.folder_id)) if to_convert else 0
+        
+        logger.info(f"Uploaded {len(self.uploaded)} original files and {gdoc_uploads} Google Docs to Google Drive in folder '{self.folder_name}'")
+        return len(self.uploaded) + gdoc_uploads
+
+def upload_files_to_drive(directory_path, parent_folder_id=None, file_filter=None, workers=upload_workers):
     """
     Upload all files in a directory to Google Drive.
     
@@ -185,39 +774,15 @@ def upload_files_to_drive(directory_path, parent_folder_id=None, file_filter=Non
         parent_folder_id: ID of the parent folder in Google Drive (optional)
         file_filter: Filter function to determine which files to upload (optional)
                     The function should take a filename as input and return True/False
+        workers: Number of uploads running at once (optional, 1 uploads sequentially)
     
     Returns:
         Number of files successfully uploaded
     """
-    # Initialize Drive service
-    service = setup_drive_service()
-    if not service:
-        return 0
-    
-    # Create a dated folder
-    today_str = datetime.now().strftime('%d-%m-%Y')
-    
-    # If parent_folder_id provided, create dated subfolder inside it
-    # If not, create dated folder at root level
-    dated_folder_id = create_dated_folder(service, today_str)
-    if not dated_folder_id:
+    uploader = FolderUploader(parent_folder_id, workers=workers)
+    if not uploader.folder_id:
         return 0
     
-    # If parent_folder_id exists, move the dated folder inside it
-    if parent_folder_id:
-        try:
-            # Update the dated folder to be a child of the parent folder
-            service.files().update(
-                fileId=dated_folder_id,
-                addParents=parent_folder_id,
-                removeParents='root',
-                fields='id, parents'
-            ).execute()
-            logger.info(f"Moved dated folder {today_str} into parent folder {parent_folder_id}")
-        except Exception as e:
-            logger.error(f"Error moving dated folder into parent: {e}")
-            # Continue with upload even if move fails
-    
     # Get list of files in directory
     files = [f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f))]
     
@@ -225,21 +790,15 @@ def upload_files_to_drive(directory_path, parent_folder_id=None, file_filter=Non
     if file_filter and callable(file_filter):
         files = [f for f in files if file_filter(f)]
     
-    # Upload each file
-    successful_uploads = 0
-    gdoc_uploads = 0
-    for file_name in files:
-        file_path = os.path.join(directory_path, file_name)
-        file_id = upload_file_to_drive(service, file_path, dated_folder_id)
-        if file_id:
-            successful_uploads += 1
-        # Try uploading as Google Doc if supported
-        gdoc_id = upload_file_as_gdoc(service, file_path, dated_folder_id)
-        if gdoc_id:
-            gdoc_uploads += 1
-    
-    logger.info(f"Uploaded {successful_uploads} original files and {gdoc_uploads} Google Docs to Google Drive in folder '{today_str}'")
-    return successful_uploads + gdoc_uploads
+    # Largest files first, so the slowest upload starts as early as possible
+    file_paths = sorted(
+        (os.path.join(directory_path, file_name) for file_name in files),
+        key=os.path.getsize,
+        reverse=True
+    )
+    for file_path in file_paths:
+        uploader.submit(file_path)
+    return uploader.finish()
 
 # Example usage 
 if __name__ == "__main__":
@@ -250,4 +809,7 @@ if __name__ == "__main__":
     parent_folder_id = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
     
     # Upload all files
-    upload_files_to_drive(directory_path, parent_folder_id=parent_folder_id)
+    try:
+        upload_files_to_drive(directory_path, parent_folder_id=parent_folder_id)
+    finally:
+        metrics.write_report('drive_uploader')
@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Where each script writes its run report (<name>.json), and whether to also write
+# a Prometheus textfile (<name>.prom) for node_exporter's textfile collector
+metrics_dir = os.getenv('METRICS_DIR', os.path.join(os.getenv('GITHUB_WORKSPACE', '.'), '.metrics'))
+prometheus_textfile = os.getenv('METRICS_PROMETHEUS', '0') == '1'
+
+# Prefix of every Prometheus metric name
+PREFIX = 'news_'
+
+# Histogram buckets for durations in seconds and for throughput in MB/s
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MBPS_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Count, sum, extremes and bucketed distribution of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self):
+        """Return (upper bound, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip([*self.buckets, float('inf')], self.bucket_counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """
+    Counters, gauges and histograms of one run, keyed by name and labels.
+
+    Safe to update from the event loop and from worker threads alike.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def report(self, name):
+        """Return the run report as a JSON-serializable dict."""
+        finished = time.time()
+
+        def series(values, render):
+            grouped = {}
+            for (metric, labels), value in sorted(values.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+                grouped.setdefault(metric, []).append({'labels': dict(labels), **render(value)})
+            return grouped
+
+        with self._lock:
+            return {
+                'name': name,
+                'started': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                'finished': datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+                'duration': round(finished - self.started, 3),
+                'counters': series(self.counters, lambda value: {'value': value}),
+                'gauges': series(self.gauges, lambda value: {'value': value}),
+                'histograms': series(self.histograms, lambda histogram: {
+                    'count': histogram.count,
+                    'sum': round(histogram.sum, 6),
+                    'min': histogram.min,
+                    'max': histogram.max,
+                    'buckets': {str(bound): count for bound, count in histogram.cumulative()},
+                }),
+            }
+
+    def prometheus(self, name):
+        """Render the metrics in the Prometheus text exposition format."""
+        def label_text(labels, **extra):
+            pairs = [*labels, *extra.items()]
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        lines = []
+        typed = set()
+
+        def declare(metric, kind):
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} {kind}')
+
+        with self._lock:
+            for (metric, labels), value in sorted(self.counters.items(), key=str):
+                declare(f'{PREFIX}{metric}_total', 'counter')
+                lines.append(f'{PREFIX}{metric}_total{label_text(labels)} {value}')
+            for (metric, labels), value in sorted(self.gauges.items(), key=str):
+                declare(f'{PREFIX}{metric}', 'gauge')
+                lines.append(f'{PREFIX}{metric}{label_text(labels)} {value}')
+            for (metric, labels), histogram in sorted(self.histograms.items(), key=str):
+                declare(f'{PREFIX}{metric}', 'histogram')
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{PREFIX}{metric}_bucket{label_text(labels, le=le)} {count}')
+                lines.append(f'{PREFIX}{metric}_sum{label_text(labels)} {histogram.sum}')
+                lines.append(f'{PREFIX}{metric}_count{label_text(labels)} {histogram.count}')
+        lines.append(f'{PREFIX}run_duration_seconds{label_text((("script", name),))} {time.time() - self.started}')
+        lines.append(f'{PREFIX}run_finished_timestamp_seconds{label_text((("script", name),))} {time.time()}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+inc = registry.inc
+set_gauge = registry.set
+observe = registry.observe
+
+
+@contextmanager
+def timer(name, buckets=SECONDS_BUCKETS, **labels):
+    """Observe the time spent in the with block, in seconds."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.monotonic() - started, buckets, **labels)
+
+
+def _write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_report(name, directory=None):
+    """
+    Write the run report of a script to <directory>/<name>.json, plus
+    <directory>/<name>.prom when METRICS_PROMETHEUS=1.
+
+    Args:
+        name: Name of the script (or pipeline) the report is for
+        directory: Output directory (optional, defaults to metrics_dir)
+    """
+    directory = directory or metrics_dir
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _write(os.path.join(directory, f'{name}.json'), json.dumps(registry.report(name), indent=2) + '\n')
+        if prometheus_textfile:
+            _write(os.path.join(directory, f'{name}.prom'), registry.prometheus(name))
+        logger.info(f"Wrote run report to {os.path.join(directory, name)}.json")
+    except OSError as e:
+        logger.error(f"Failed to write run report to {directory}: {e}")
@@ -0,0 +1,141 @@
+from telethon import utils
+from telethon.network import MTProtoSender
+from telethon.tl.functions.upload import GetFileRequest
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Telegram only serves file parts whose size is a power of two between 4 KB and 512 KB
+MIN_PART_SIZE = 4 * 1024
+MAX_PART_SIZE = 512 * 1024
+
+
+def normalize_part_size(part_size):
+    """Round a requested part size down to a size upload.getFile accepts."""
+    part_size = max(MIN_PART_SIZE, min(MAX_PART_SIZE, part_size))
+    return 1 << (part_size.bit_length() - 1)
+
+
+async def _connect_sender(client, dc_id, auth_key):
+    """Open a new connection to dc_id that reuses an existing authorization key."""
+    dc = await client._get_dc(dc_id)
+    sender = MTProtoSender(auth_key, loggers=client._log)
+    await sender.connect(client._connection(
+        dc.ip_address,
+        dc.port,
+        dc.id,
+        loggers=client._log,
+        proxy=client._proxy,
+        local_addr=client._local_addr
+    ))
+    return sender
+
+
+async def open_senders(client, dc_id, count):
+    """
+    Open several senders to the data center that stores a file.
+
+    Args:
+        client: Connected TelegramClient
+        dc_id: The file's home data center
+        count: Number of connections to open
+
+    Returns:
+        List of connected MTProtoSender objects
+    """
+    senders = []
+    if dc_id is None or dc_id == client.session.dc_id:
+        auth_key = client.session.auth_key
+    else:
+        # Export our authorization once, then reuse the resulting key for the other connections
+        first = await client._create_exported_sender(dc_id)
+        senders.append(first)
+        auth_key = first.auth_key
+
+    senders.extend(await asyncio.gather(*(
+        _connect_sender(client, dc_id or client.session.dc_id, auth_key)
+        for _ in range(count - len(senders))
+    )))
+    return senders
+
+
+async def download_parallel(client, message, save_path, connections=4, part_size=MAX_PART_SIZE,
+                            progress_callback=None, offset=0, checkpoint=None):
+    """
+    Download a document by fetching byte ranges over several connections.
+
+    Parts are written straight into a preallocated file at their offsets, so
+    they can arrive in any order. An existing file is kept and only the bytes
+    from offset onwards are fetched, which lets an interrupted download resume.
+
+    Args:
+        client: Connected TelegramClient
+        message: Message carrying the document
+        save_path: Path of the file to write
+        connections: Number of connections fetching parts concurrently
+        part_size: Bytes requested per part (rounded to a size Telegram accepts)
+        progress_callback: Optional callable(current, total), sync or async
+        offset: Bytes already present at the start of save_path
+        checkpoint: Optional callable(offset) told whenever the contiguous
+            completed prefix of the file grows
+
+    Returns:
+        Number of bytes fetched
+    """
+    dc_id, location = utils.get_input_location(message.media)
+    total = message.file.size
+    part_size = normalize_part_size(part_size)
+    part_count = math.ceil(total / part_size)
+    first_part = min(offset, total) // part_size
+    connections = max(1, min(connections, part_count - first_part))
+
+    started = time.monotonic()
+    senders = await open_senders(client, dc_id, connections)
+    resumed = first_part * part_size
+    downloaded = resumed
+    completed = set()
+    watermark = first_part
+
+    try:
+        with open(save_path, 'r+b' if os.path.exists(save_path) else 'wb') as f:
+            f.truncate(total)
+            fd = f.fileno()
+
+            async def fetch_parts(sender, start):
+                nonlocal downloaded, watermark
+                for part in range(start, part_count, connections):
+                    part_offset = part * part_size
+                    result = await client._call(sender, GetFileRequest(location, offset=part_offset, limit=part_size))
+                    os.pwrite(fd, result.bytes, part_offset)
+                    downloaded += len(result.bytes)
+
+                    completed.add(part)
+                    while watermark in completed:
+                        completed.discard(watermark)
+                        watermark += 1
+                    if checkpoint:
+                        checkpoint(min(watermark * part_size, total))
+                    if progress_callback:
+                        await utils.maybe_async(progress_callback(downloaded, total))
+
+            await asyncio.gather(*(
+                fetch_parts(sender, first_part + i) for i, sender in enumerate(senders)
+            ))
+    finally:
+        await asyncio.gather(*(sender.disconnect() for sender in senders), return_exceptions=True)
+
+    if downloaded != total:
+        raise IOError(f"Expected {total} bytes but received {downloaded}")
+
+    fetched = total - resumed
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logger.info(
+        f"Parallel download of {os.path.basename(save_path)}: {fetched / 1048576:.1f} MB in {elapsed:.1f}s "
+        f"({fetched / 1048576 / elapsed:.2f} MB/s over {connections} connections, {part_size // 1024} KB parts"
+        + (f", resumed at byte {resumed})" if resumed else ")")
+    )
+    return fetched
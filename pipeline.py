@@ -0,0 +1,129 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import asyncio
+import logging
+import os
+
+import attachment_optimizer
+import metrics
+import send_email
+from drive_uploader import FolderUploader
+from telegram_downloader import channel_confs, channel_targets, channels, create_client, dated_dir, download_all
+
+logger = logging.getLogger(__name__)
+
+# Newspapers emailed separately, as send_email's newspaper_filter values
+NEWSPAPERS = ['indian_express', 'the_hindu']
+
+
+async def run_pipeline(watch=False):
+    """
+    Download today's targets, emailing and uploading them as they land.
+
+    Args:
+        watch: Wait for new posts instead of scanning history
+    """
+    loop = asyncio.get_running_loop()
+    today = datetime.now()
+    targets = {channel['username']: channel_targets(channel, today) for channel in channels}
+    confs = [conf for channel in channels for conf in channel_confs(channel)]
+    newspaper_targets = {
+        newspaper: {target for names in targets.values() for target in names if newspaper in target.lower()}
+        for newspaper in NEWSPAPERS
+    }
+
+    uploader = await asyncio.to_thread(FolderUploader, os.getenv('GOOGLE_DRIVE_FOLDER_ID'))
+    optimize = attachment_optimizer.prepare_output_dir(dated_dir)
+    optimizer_pool = ProcessPoolExecutor(max_workers=max(1, attachment_optimizer.optimize_workers)) if optimize else None
+    session = send_email.open_session()
+
+    resolved = set()
+    stages = {}
+    email_tasks = {}
+
+    def hand_off(file_name):
+        """Start the Drive upload and optimization of a file in dated_dir."""
+        if file_name in stages:
+            return
+        file_path = os.path.join(dated_dir, file_name)
+        pending = []
+        upload = uploader.submit(file_path)
+        if upload and send_email.delivery_mode != 'attach':
+            # Drive links need the file's ID, so the email waits for its upload
+            pending.append(asyncio.wrap_future(upload))
+        profile = attachment_optimizer.profile_for(file_name, confs)
+        if optimize and profile:
+            pending.append(optimize_file(file_name, file_path, profile))
+        stages[file_name] = asyncio.gather(*pending, return_exceptions=True)
+
+    async def optimize_file(file_name, file_path, profile):
+        try:
+            sizes = await loop.run_in_executor(optimizer_pool, attachment_optimizer.optimize_file, file_path, profile)
+        except Exception as e:
+            logger.error(f"Failed to optimize {file_name}, emailing the original: {e}")
+            return
+        attachment_optimizer.log_result(file_name, *sizes)
+
+    async def email(newspaper):
+        # Album pages and stitched PDFs are named after their target, so wait for every file of the newspaper
+        await asyncio.gather(*(stage for name, stage in stages.items() if newspaper in name.lower()))
+        logger.info(f"All {newspaper} targets are done, sending its email")
+        await asyncio.to_thread(send_email.send_email, dated_dir, newspaper, session)
+
+    def send_ready_emails():
+        for newspaper, names in newspaper_targets.items():
+            if names and newspaper not in email_tasks and names <= resolved:
+                email_tasks[newspaper] = asyncio.create_task(email(newspaper))
+
+    def on_download(target_filename):
+        hand_off(target_filename)
+        resolved.add(target_filename)
+        send_ready_emails()
+
+    def on_channel_done(channel):
+        # A channel's targets that weren't downloaded by now never will be
+        resolved.update(targets[channel['username']])
+        send_ready_emails()
+
+    try:
+        try:
+            async with create_client() as client:
+                me = await client.get_me()
+                logger.info(f"Successfully connected as {me.username}")
+                await download_all(client, watch, on_download, on_channel_done)
+        except Exception as e:
+            # Files downloaded so far, or by an earlier run, are still uploaded and emailed
+            logger.error(f"Download failed, continuing with the files already in {dated_dir}: {e}")
+
+        # Files that were already in the folder (or weren't downloaded this run)
+        # are uploaded too, and any email not sent yet goes out now
+        for file_name in sorted(os.listdir(dated_dir)):
+            if os.path.isfile(os.path.join(dated_dir, file_name)):
+                hand_off(file_name)
+        resolved.update(name for names in newspaper_targets.values() for name in names)
+        send_ready_emails()
+
+        results = await asyncio.gather(*email_tasks.values(), return_exceptions=True)
+        for newspaper, result in zip(email_tasks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send the {newspaper} email: {result}")
+        await asyncio.gather(*stages.values())
+    finally:
+        await asyncio.to_thread(uploader.finish)
+        session.close()
+        if optimizer_pool:
+            optimizer_pool.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download, email and upload today's newspapers in one run")
+    parser.add_argument('--watch', action='store_true',
+                        help="stay connected and handle today's files as soon as they are posted")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_pipeline(watch=args.watch))
+    except KeyboardInterrupt:
+        logger.info("Pipeline stopped by user")
+    finally:
+        metrics.write_report('pipeline')
@@ -1,86 +1,510 @@
 import smtplib
-from email.message import EmailMessage
+import base64
+import mimetypes
 import os
+import queue
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
+from email.header import Header
+from email.utils import formatdate, make_msgid
 import pytz
+import metrics
+from attachment_optimizer import Image, encode_jpeg, optimized_path
+from drive_uploader import grant_permissions, setup_drive_service, uploaded_file_ids
 
-def send_email(folder, newspaper_filter=None):
+# Largest message to send, encoded; Gmail rejects anything over 25 MB
+max_message_size = int(float(os.getenv('EMAIL_MAX_MESSAGE_MB', '24')) * 1024 * 1024)
+
+# Envelope recipients per message, and SMTP connections used to send batches in parallel
+email_batch_size = int(os.getenv('EMAIL_BATCH_SIZE', '50'))
+email_connections = int(os.getenv('EMAIL_CONNECTIONS', '3'))
+# Retries, with exponential backoff, for recipients refused with a temporary (4xx) error
+email_retries = int(os.getenv('EMAIL_RETRIES', '3'))
+
+# Delivery mode: 'attach' always attaches the files, 'link' always sends Google Drive
+# links instead, 'auto' sends links when the attachments would exceed link_threshold
+delivery_mode = os.getenv('EMAIL_DELIVERY_MODE', 'auto')
+link_threshold = int(float(os.getenv('EMAIL_LINK_THRESHOLD_MB', '24')) * 1024 * 1024)
+# Attach small previews of linked images (needs Pillow)
+link_previews = os.getenv('EMAIL_LINK_PREVIEWS', '1') == '1'
+PREVIEW_SIDE = 480
+
+# Raw bytes read per chunk while encoding an attachment (a multiple of 57, so
+# every chunk encodes to whole 76-character lines)
+ENCODE_CHUNK_SIZE = 57 * 16 * 1024
+
+# Allowance for the message headers, body text and each attachment's MIME headers
+MESSAGE_OVERHEAD = 4 * 1024
+PART_OVERHEAD = 512
+
+def encoded_size(file_size):
     """
-    Send an email with news articles from the specified folder.
-    
+    Return the size of a file once base64-encoded into 76-character CRLF lines.
+
     Args:
-        folder: Path to the folder containing news articles
-        newspaper_filter: Filter articles by newspaper name ('indian_express' or 'the_hindu')
-                     If None, all articles are sent
+        file_size: Size of the file in bytes
+
+    Returns:
+        Encoded size in bytes
+    """
+    encoded = 4 * ((file_size + 2) // 3)
+    lines = (encoded + 75) // 76
+    return encoded + 2 * lines + PART_OVERHEAD
+
+def fits_in_message(file_path, max_size=max_message_size):
+    """Return True if a file can be attached to a message of at most max_size bytes."""
+    return encoded_size(os.path.getsize(file_path)) <= max_size - MESSAGE_OVERHEAD
+
+def pack_attachments(file_paths, max_size=max_message_size):
+    """
+    Split attachments into as few messages as possible under max_size.
+
+    Files are placed largest first, each into the first message that still
+    has room (first-fit decreasing). A file too large for any message is
+    left out, since the server would reject the message carrying it.
+
+    Args:
+        file_paths: Paths of the files to attach
+        max_size: Largest encoded message size in bytes
+
+    Returns:
+        List of lists of file paths, one list per message
+    """
+    capacity = max_size - MESSAGE_OVERHEAD
+    messages = []
+    for file_path in sorted(file_paths, key=os.path.getsize, reverse=True):
+        size = encoded_size(os.path.getsize(file_path))
+        if size > capacity:
+            print(f"Warning: leaving out {os.path.basename(file_path)}, larger than the {max_size / 1048576:.0f} MB message limit")
+            continue
+        for message in messages:
+            if message['size'] + size <= capacity:
+                message['files'].append(file_path)
+                message['size'] += size
+                break
+        else:
+            messages.append({'files': [file_path], 'size': size})
+    return [message['files'] for message in messages]
+
+def iter_message(headers, body, file_paths):
+    """
+    Generate a multipart/mixed message as CRLF-terminated byte chunks.
+
+    Attachments are read and base64-encoded one chunk at a time, so memory
+    use stays bounded no matter how large the files are.
+
+    Args:
+        headers: Dict of top-level header names to values
+        body: Plain text body
+        file_paths: Paths of the files to attach
+
+    Yields:
+        Chunks of the message as bytes
+    """
+    boundary = f"=============={uuid.uuid4().hex}=="
+    lines = [f"{name}: {Header(value, 'utf-8').encode() if not value.isascii() else value}" for name, value in headers.items()]
+    lines += [
+        'MIME-Version: 1.0',
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        '',
+        f'--{boundary}',
+        'Content-Type: text/plain; charset="utf-8"',
+        'Content-Transfer-Encoding: base64',
+        '',
+        base64.encodebytes(body.encode('utf-8')).decode('ascii').replace('\n', '\r\n').rstrip('\r\n'),
+    ]
+    yield ('\r\n'.join(lines) + '\r\n').encode('ascii')
+
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        part_headers = [
+            f'--{boundary}',
+            f'Content-Type: {content_type}',
+            'Content-Transfer-Encoding: base64',
+            f'Content-Disposition: attachment; filename="{file_name}"',
+            '',
+        ]
+        yield ('\r\n'.join(part_headers) + '\r\n').encode('ascii')
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(ENCODE_CHUNK_SIZE), b''):
+                yield base64.encodebytes(chunk).replace(b'\n', b'\r\n')
+
+    yield f'--{boundary}--\r\n'.encode('ascii')
+
+def send_streaming(smtp, sender, receivers, headers, body, file_paths):
+    """
+    Send a message over an open SMTP connection, streaming its attachments.
+
+    Args:
+        smtp: Connected and authenticated smtplib.SMTP(_SSL) instance
+        sender: Envelope sender address
+        receivers: Envelope recipient addresses
+        headers: Dict of top-level header names to values
+        body: Plain text body
+        file_paths: Paths of the files to attach
     """
-    sender = os.getenv('EMAIL_SENDER')
-    password = os.getenv('EMAIL_PASSWORD')
+    code, response = smtp.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+    refused = {}
+    for receiver in receivers:
+        code, response = smtp.rcpt(receiver)
+        if code not in (250, 251):
+            refused[receiver] = (code, response)
+    if len(refused) == len(receivers):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    smtp.putcmd('data')
+    code, response = smtp.getreply()
+    if code != 354:
+        raise smtplib.SMTPDataError(code, response)
+    # Every generated line starts with a header, a boundary or base64 text,
+    # never a '.', so no dot-stuffing is needed
+    for chunk in iter_message(headers, body, file_paths):
+        smtp.send(chunk)
+    smtp.send(b'.\r\n')
+    code, response = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+def is_transient(code):
+    """Return True for SMTP failures worth retrying: 4xx replies and dropped connections."""
+    return code is None or 400 <= code < 500
+
+class DeliverySession:
+    """
+    Authenticated SMTP connections shared by every email sent in a run.
+
+    Connections are opened on first use, logged in once and reused for all
+    later messages. Recipients are sent as envelope-only (Bcc) batches, so no
+    recipient sees the others' addresses, and batches go out over up to
+    `connections` connections in parallel.
+    """
+
+    def __init__(self, sender, password, host='smtp.gmail.com', port=465,
+                 batch_size=email_batch_size, connections=email_connections, retries=email_retries):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.batch_size = max(1, batch_size)
+        self.connections = max(1, connections)
+        self.retries = retries
+        self._idle = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self):
+        with metrics.timer('smtp_connect_seconds'):
+            smtp = smtplib.SMTP_SSL(self.host, self.port)
+            try:
+                smtp.login(self.sender, self.password)
+            except Exception:
+                smtp.close()
+                raise
+        return smtp
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+
+    def _send_batch(self, headers, body, file_paths, recipients):
+        """
+        Send one message to a batch of recipients, retrying temporary failures.
+
+        Returns:
+            Dict of recipients that could not be delivered to (code, response)
+        """
+        pending = list(recipients)
+        failed = {}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(2 ** attempt)
+            smtp = None
+            try:
+                # Failing to connect or log in is retried like a dropped connection
+                smtp = self._acquire()
+                started = time.monotonic()
+                refused = send_streaming(smtp, self.sender, pending, headers, body, file_paths)
+                metrics.observe('smtp_send_seconds', time.monotonic() - started)
+                self._idle.put(smtp)
+            except smtplib.SMTPRecipientsRefused as e:
+                refused = e.recipients
+                self._idle.put(smtp)
+            except smtplib.SMTPResponseException as e:
+                # The connection is mid-transaction (or never logged in) and can't be reused
+                if smtp:
+                    smtp.close()
+                if isinstance(e, smtplib.SMTPSenderRefused):
+                    raise
+                # A permanent failure (e.g. 552, message too large) fails this message only
+                refused = {recipient: (e.smtp_code, e.smtp_error) for recipient in pending}
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                if smtp:
+                    smtp.close()
+                refused = {recipient: (None, str(e)) for recipient in pending}
+
+            pending = [recipient for recipient, (code, _) in refused.items() if is_transient(code)]
+            failed.update({recipient: error for recipient, error in refused.items() if recipient not in pending})
+            if not pending:
+                return failed
+            if attempt < self.retries:
+                print(f"Temporary failure for {len(pending)} recipients, retrying ({attempt + 1}/{self.retries})")
+
+        failed.update({recipient: refused[recipient] for recipient in pending})
+        return failed
+
+    def send(self, headers, body, file_paths, recipients):
+        """
+        Send a message to every recipient, in batches of batch_size.
+
+        Args:
+            headers: Dict of top-level header names to values (without To)
+            body: Plain text body
+            file_paths: Paths of the files to attach
+            recipients: Addresses to deliver to
+
+        Returns:
+            Dict of recipients that could not be delivered to (code, response)
+        """
+        headers = {**headers, 'To': 'undisclosed-recipients:;'}
+        batches = [recipients[i:i + self.batch_size] for i in range(0, len(recipients), self.batch_size)]
+        failed = {}
+        if len(batches) == 1 or self.connections == 1:
+            for batch in batches:
+                failed.update(self._send_batch(headers, body, file_paths, batch))
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.connections, len(batches))) as executor:
+                for result in executor.map(lambda batch: self._send_batch(headers, body, file_paths, batch), batches):
+                    failed.update(result)
+        for recipient, (code, response) in failed.items():
+            print(f"Failed to deliver to {recipient}: {code} {response}")
+        metrics.inc('email_messages')
+        metrics.inc('email_recipients', len(recipients) - len(failed), result='delivered')
+        metrics.inc('email_recipients', len(failed), result='failed')
+        metrics.inc('email_bytes', sum(encoded_size(os.path.getsize(file_path)) for file_path in file_paths) * len(batches))
+        return failed
+
+def drive_links(folder, file_paths, receivers):
+    """
+    Share the Drive copies of files with the receivers and return their links.
+
+    Args:
+        folder: Path of the dated folder, named like the dated Drive folder
+        file_paths: Paths of the files to link to
+        receivers: Addresses to grant reader access to
+
+    Returns:
+        Tuple of (dict mapping the names of the files found on Drive to their
+        links, set of the receivers granted access to all of them)
+    """
+    service = setup_drive_service()
+    if not service:
+        return {}, set()
+    file_names = [os.path.basename(file_path) for file_path in file_paths]
+    folder_name = os.path.basename(os.path.normpath(folder))
+    file_ids = uploaded_file_ids(service, folder_name, file_names, os.getenv('GOOGLE_DRIVE_FOLDER_ID'))
+    if not file_ids:
+        print(f"None of the files were found in the Drive folder '{folder_name}'")
+        return {}, set()
+    granted = grant_permissions(service, list(file_ids.values()), receivers)
+    print(f"Granted {len(granted)} of {len(receivers)} receivers reader access to {len(file_ids)} Drive files")
+    return {name: f"https://drive.google.com/file/d/{file_id}/view" for name, file_id in file_ids.items()}, granted
+
+def write_previews(file_paths, directory):
+    """
+    Write small JPEG previews of the images among file_paths.
+
+    Args:
+        file_paths: Paths of the linked files
+        directory: Directory to write the previews to
+
+    Returns:
+        Paths of the previews written
+    """
+    if Image is None:
+        return []
+    previews = []
+    for file_path in file_paths:
+        if not file_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+            continue
+        preview_path = os.path.join(directory, f"preview_{os.path.splitext(os.path.basename(file_path))[0]}.jpg")
+        with Image.open(file_path) as image:
+            image.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE))
+            data = encode_jpeg(image, 70)
+        with open(preview_path, 'wb') as f:
+            f.write(data)
+        previews.append(preview_path)
+    return previews
+
+def load_receivers():
+    """Return the primary receiver followed by any ADDITIONAL_EMAIL_RECEIVERS."""
     primary_receiver = os.getenv('EMAIL_RECEIVER')
-    
+
     # Get additional receivers from environment variable
     # Format should be comma-separated email addresses
     additional_receivers = os.getenv('ADDITIONAL_EMAIL_RECEIVERS', '')
-    
+
     # Create a list of all receivers
     all_receivers = [primary_receiver]
     if additional_receivers:
-        all_receivers.extend([email.strip() for email in additional_receivers.split(',')])
-    
+        all_receivers.extend([email.strip() for email in additional_receivers.split(',') if email.strip()])
+    return all_receivers
+
+def open_session():
+    """Open a DeliverySession with the EMAIL_SENDER / EMAIL_PASSWORD credentials."""
+    return DeliverySession(os.getenv('EMAIL_SENDER'), os.getenv('EMAIL_PASSWORD'))
+
+def send_email(folder, newspaper_filter=None, session=None):
+    """
+    Send an email with news articles from the specified folder.
+
+    Attachments are split across as many messages as needed to stay under
+    max_message_size; the subjects of split emails are numbered "(1/3)".
+    A file too large for any message is linked on Google Drive instead, or
+    listed in the body if it is not found there. Receivers Drive could not
+    give access to the linked files (e.g. addresses without a Google
+    account) are sent the attachments instead of the links.
+
+    Args:
+        folder: Path to the folder containing news articles
+        newspaper_filter: Filter articles by newspaper name ('indian_express' or 'the_hindu')
+                     If None, all articles are sent
+        session: DeliverySession to send through; one is opened (and closed)
+                 for this call if not given
+    """
+    all_receivers = load_receivers()
+
     # Get Dublin time
     dublin_tz = pytz.timezone('Europe/Dublin')
     dublin_time = datetime.now(dublin_tz)
     dublin_time_str = dublin_time.strftime('%d-%m-%Y %H:%M:%S %Z')
-    
+
     # Create email based on newspaper type
-    msg = EmailMessage()
     if newspaper_filter == 'indian_express':
-        msg['Subject'] = f'Indian Express Articles - {dublin_time_str}'
-        msg.set_content(f"Attached are today's articles from The Indian Express.\n\nSent at: {dublin_time_str} (Dublin Time)")
+        subject = f'Indian Express Articles - {dublin_time_str}'
+        articles = "today's articles from The Indian Express"
     elif newspaper_filter == 'the_hindu':
-        msg['Subject'] = f'The Hindu Articles - {dublin_time_str}'
-        msg.set_content(f"Attached are today's articles from The Hindu.\n\nSent at: {dublin_time_str} (Dublin Time)")
+        subject = f'The Hindu Articles - {dublin_time_str}'
+        articles = "today's articles from The Hindu"
     else:
-        msg['Subject'] = f'Daily News Articles - {dublin_time_str}'
-        msg.set_content(f"Attached are today's news articles.\n\nSent at: {dublin_time_str} (Dublin Time)")
-    
-    msg['From'] = sender
-    msg['To'] = ', '.join(all_receivers)
-
-    # Counter to keep track of how many files were attached
-    attached_files = 0
-    
+        subject = f'Daily News Articles - {dublin_time_str}'
+        articles = "today's news articles"
+    body = f"Attached are {articles}."
+    sent_at = f"\n\nSent at: {dublin_time_str} (Dublin Time)"
+
+    attachments = []
+
     for file_name in os.listdir(folder):
         # Filter files based on newspaper parameter
         include_file = False
-        
+
         if newspaper_filter == 'indian_express':
             include_file = file_name.lower().startswith('indian_express') or 'indian_express' in file_name.lower()
         elif newspaper_filter == 'the_hindu':
             include_file = file_name.lower().startswith('the_hindu') or 'the_hindu' in file_name.lower()
         else:
             include_file = True  # Include all files if no filter
-                
+
         if include_file:
             file_path = os.path.join(folder, file_name)
             if os.path.isfile(file_path):
-                with open(file_path, 'rb') as f:
-                    data = f.read()
-                    msg.add_attachment(data, maintype='application', subtype='octet-stream', filename=file_name)
-                    attached_files += 1
+                # Prefer the smaller variant written by attachment_optimizer, if any
+                if os.path.isfile(optimized_path(file_path)):
+                    file_path = optimized_path(file_path)
+                    print(f"Attached file: {file_name} (optimized)")
+                else:
                     print(f"Attached file: {file_name}")
-    
+                attachments.append(file_path)
+
     # Only send email if there are attachments
-    if attached_files > 0:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(sender, password)
-            smtp.send_message(msg)
-            print(f"Email with {attached_files} {newspaper_filter if newspaper_filter else 'news'} articles sent successfully at {dublin_time_str} (Dublin Time)")
+    if attachments:
+        article_count = len(attachments)
+
+        # Link to the Drive copies instead when attaching would be too large;
+        # files too large for any message are always linked
+        links, granted = {}, set()
+        too_large = [file_path for file_path in attachments if not fits_in_message(file_path)]
+        total_size = sum(encoded_size(os.path.getsize(file_path)) for file_path in attachments)
+        if delivery_mode == 'link' or (delivery_mode == 'auto' and total_size > link_threshold):
+            links, granted = drive_links(folder, attachments, all_receivers)
+        elif too_large:
+            links, granted = drive_links(folder, too_large, all_receivers)
+        linked = [file_path for file_path in attachments if os.path.basename(file_path) in links]
+
+        # Receivers Drive could not share the files with get them attached instead
+        link_receivers = [receiver for receiver in all_receivers if receiver in granted] if linked else []
+        attach_receivers = [receiver for receiver in all_receivers if receiver not in link_receivers]
+        deliveries = []
+        if link_receivers:
+            attached = [file_path for file_path in attachments if file_path not in linked and file_path not in too_large]
+            lines = [f"- {name} ({os.path.getsize(file_path) / 1048576:.1f} MB): {links[name]}"
+                     for file_path in linked for name in [os.path.basename(file_path)]]
+            link_body = (f"Here are {articles} on Google Drive:\n\n" + '\n'.join(lines)
+                         + ("\n\nThe rest are attached." if attached else ''))
+            unsent = [file_path for file_path in too_large if file_path not in linked]
+            deliveries.append((link_receivers, link_body, attached, linked, unsent))
+            print(f"Linking {len(linked)} files on Google Drive instead of attaching them")
+        if attach_receivers:
+            if link_receivers:
+                print(f"Attaching the files for {len(attach_receivers)} receivers not given access on Google Drive")
+            attached = [file_path for file_path in attachments if file_path not in too_large]
+            deliveries.append((attach_receivers, body, attached, [], too_large))
+
+        with tempfile.TemporaryDirectory() as preview_dir, nullcontext(session) if session else open_session() as session:
+            for receivers, message_body, attached, linked, unsent in deliveries:
+                if linked and link_previews:
+                    attached = attached + write_previews(linked, preview_dir)
+                if unsent:
+                    names = '\n'.join(f"- {os.path.basename(file_path)} ({os.path.getsize(file_path) / 1048576:.1f} MB)" for file_path in unsent)
+                    message_body += f"\n\nToo large to email, and not shared on Google Drive:\n{names}"
+                    print(f"Warning: not sending {len(unsent)} files larger than the {max_message_size / 1048576:.0f} MB message limit")
+                messages = pack_attachments(attached) or [[]]
+                for number, file_paths in enumerate(messages, 1):
+                    headers = {
+                        'Subject': subject if len(messages) == 1 else f'{subject} ({number}/{len(messages)})',
+                        'From': session.sender,
+                        'Date': formatdate(localtime=True),
+                        'Message-ID': make_msgid(),
+                    }
+                    failed = session.send(headers, message_body + sent_at, file_paths, receivers)
+                    print(f"Sent email {number}/{len(messages)} with {len(file_paths)} attachments to {len(receivers) - len(failed)} recipients")
+        print(f"Email with {article_count} {newspaper_filter if newspaper_filter else 'news'} articles sent successfully at {dublin_time_str} (Dublin Time)")
     else:
         print(f"No {newspaper_filter if newspaper_filter else 'news'} articles found to send")
 
 if __name__ == '__main__':
     today = datetime.now().strftime('%d-%m-%Y')
-    
-    # Send separate emails for each newspaper
-    send_email(today, 'indian_express')
-    send_email(today, 'the_hindu')
+
+    # Send separate emails for each newspaper over one SMTP session
+    try:
+        with open_session() as session:
+            send_email(today, 'indian_express', session)
+            send_email(today, 'the_hindu', session)
+    finally:
+        metrics.write_report('send_email')
@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path, description):
+    """
+    Load a JSON state file written by a previous run.
+
+    Args:
+        path: Path of the file
+        description: What the file holds, for the log (e.g. 'scan state')
+
+    Returns:
+        The parsed content, or an empty dict if the file is missing or unreadable
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable {description} {path}: {e}")
+        return {}
+
+
+def save_json_atomic(data, path, description):
+    """
+    Write a JSON state file atomically, so an interrupted run cannot corrupt it.
+
+    Args:
+        data: JSON-serializable content
+        path: Path of the file
+        description: What the file holds, for the log (e.g. 'scan state')
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Failed to save {description} to {path}: {e}")
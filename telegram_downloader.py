@@ -1,12 +1,27 @@
 from telethon.sessions import StringSession
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.messages import ImportChatInviteRequest
+from parallel_downloader import download_parallel
+from state_files import load_json, save_json_atomic
+from attachment_optimizer import Image, stitch_images
+import metrics
+import argparse
 import asyncio
+import functools
 import os
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timedelta
 import logging
-from telethon.errors import TimeoutError
+from telethon.errors import (
+    ChannelInvalidError, ChannelPrivateError, ChatIdInvalidError, FloodWaitError, InviteHashExpiredError,
+    PeerIdInvalidError, TimeoutError, UserAlreadyParticipantError
+)
+from telethon.tl.types import (
+    InputMessagesFilterDocument, InputMessagesFilterPhotos, InputPeerChannel, InputPeerChat, InputPeerUser
+)
+from telethon.tl.functions.upload import GetFileRequest
 
 base_dir = os.getenv('GITHUB_WORKSPACE', '.')  # Use workspace directory or default to current directory
 today_str = datetime.now().strftime('%d-%m-%Y')
@@ -24,6 +39,58 @@ logger = logging.getLogger(__name__)
 api_id = 20197798
 api_hash = '109f16378f64be336b43eb678ea487df'
 
+# History scans stop at the first message posted more than scan_window_hours before
+# the start of the day looked for; max_scan_messages only caps a scan of a channel
+# that posts far more than usual
+scan_window_hours = float(os.getenv('SCAN_WINDOW_HOURS', '12'))
+max_scan_messages = int(os.getenv('SCAN_MAX_MESSAGES', '1000'))
+
+# Server-side search: whether targets are first looked up with Telegram's message
+# search, and the number of results fetched per search
+server_search = os.getenv('SERVER_SEARCH', '1') == '1'
+search_limit = int(os.getenv('SEARCH_LIMIT', '10'))
+
+# Download scheduling: total concurrent downloads, concurrent downloads per channel
+# and the time allowed for each channel's scan and downloads
+download_workers = int(os.getenv('DOWNLOAD_WORKERS', '3'))
+channel_download_limit = int(os.getenv('CHANNEL_DOWNLOAD_LIMIT', '2'))
+channel_timeout = int(os.getenv('CHANNEL_TIMEOUT', '300'))
+
+# Per-channel scan cursors kept between runs
+scan_state_file = os.getenv('SCAN_STATE_FILE', os.path.join(base_dir, '.scan_state.json'))
+
+# Resolved peers and channel memberships kept between runs, so channels aren't
+# joined or resolved again on every run (works with file and string sessions alike)
+peer_cache_file = os.getenv('PEER_CACHE_FILE', os.path.join(base_dir, '.peer_cache.json'))
+
+# Telegram request rate limiting: sustained requests per second, burst size and the
+# longest flood wait honoured before giving up on a request
+rpc_rate = float(os.getenv('RPC_RATE', '3'))
+rpc_burst = int(os.getenv('RPC_BURST', '5'))
+max_flood_wait = int(os.getenv('MAX_FLOOD_WAIT', '300'))
+
+# Most messages read from one channel by a backfill
+backfill_max_messages = int(os.getenv('BACKFILL_MAX_MESSAGES', '5000'))
+
+# Whether the pages of a highlights album are combined into one PDF in place of the
+# numbered images (e.g. The_Hindu_18-05-2025_highlights.pdf)
+highlights_pdf = os.getenv('HIGHLIGHTS_PDF', '0') == '1'
+
+# Longest time watch mode waits for today's remaining targets
+watch_timeout = int(os.getenv('WATCH_TIMEOUT', str(6 * 60 * 60)))
+
+# Partial downloads and the manifest of completed ones, used to resume and skip downloads
+download_cache_dir = os.getenv('DOWNLOAD_CACHE_DIR', os.path.join(base_dir, '.download_cache'))
+download_manifest_file = os.path.join(download_cache_dir, 'manifest.json')
+
+# Download engine: 'parallel' fetches large documents over several connections,
+# 'media' fetches every document sequentially with client.iter_download (photos
+# always go through client.download_media)
+download_engine = os.getenv('DOWNLOAD_ENGINE', 'parallel')
+download_connections = int(os.getenv('DOWNLOAD_CONNECTIONS', '4'))
+download_part_size = int(os.getenv('DOWNLOAD_PART_SIZE_KB', '512')) * 1024
+parallel_min_size = int(os.getenv('PARALLEL_MIN_SIZE_MB', '5')) * 1024 * 1024
+
 # Channel and file configurations
 channels = [
     {
@@ -33,13 +100,15 @@ channels = [
                 'source_format': 'INDIAN EXPRESS HD Delhi {date}.pdf',
                 'target_format': 'Indian_Express_{date}.pdf',
                 'date_format': '%d~%m~%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'pdf'
             },
             {
                 'source_format': 'INDIAN EXPRESS UPSC IAS EDITION HD {date}.pdf',
                 'target_format': 'Indian_Express_UPSC_{date}.pdf',
                 'date_format': '%d~%m~%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'pdf'
             }
         ],
         'type': 'newspaper'
@@ -51,6 +120,7 @@ channels = [
     #     'target_format': 'The_Hindu_{date}.pdf',
     #     'date_format': '%d-%m-%Y',
     #     'target_date_format': '%d-%m-%Y',
+    #     'optimize': 'pdf',
     #     'type': 'newspaper'
     # },
     # {
@@ -61,19 +131,22 @@ channels = [
             #     'source_format': 'THE HINDU UPSC IAS EDITION HD {date}.pdf',
             #     'target_format': 'The_Hindu_UPSC_{date}.pdf',
             #     'date_format': '%d~%m~%Y',
-            #     'target_date_format': '%d-%m-%Y'
+            #     'target_date_format': '%d-%m-%Y',
+            #     'optimize': 'pdf'
             # },
             # {
             #     'source_format': 'TH Delhi {date}.pdf',
             #     'target_format': 'The_Hindu_Delhi_{date}.pdf',
             #     'date_format': '%d--%m',
-            #     'target_date_format': '%d-%m-%Y'
+            #     'target_date_format': '%d-%m-%Y',
+            #     'optimize': 'pdf'
             # },
             # {
             #     'source_format': 'TH Delhi {date}.pdf',
             #     'target_format': 'The_Hindu_Delhi_{date}.pdf',
             #     'date_format': '%d-%m-%Y',
-            #     'target_date_format': '%d-%m-%Y'
+            #     'target_date_format': '%d-%m-%Y',
+            #     'optimize': 'pdf'
             # }
     #     ],
     #     'type': 'newspaper'
@@ -85,13 +158,15 @@ channels = [
                 'source_format': 'THE HINDU UPSC IAS EDITION HD {date}.pdf',
                 'target_format': 'The_Hindu_UPSC_{date}.pdf',
                 'date_format': '%d~%m~%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'pdf'
             },
             {
                 'source_format': 'THE HINDU AD-FREE HD {date}.pdf',
                 'target_format': 'The_Hindu_Delhi_{date}.pdf',
                 'date_format': '%d~%m~%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'pdf'
             }
         ],
         'type': 'newspaper'
@@ -104,413 +179,967 @@ channels = [
                 'text_pattern': '#ToBeReadVajiram in The Indian Express: {date}\n(Delhi edition e-paper)',
                 'target_format': 'Indian_Express_{date}.jpg',
                 'date_format': '%d/%m/%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'image'
             },
             {
                 'text_pattern': '#ToBeReadVajiram in The Hindu: {date}\n(Delhi edition e-paper)',
                 'target_format': 'The_Hindu_{date}.jpg',
                 'date_format': '%d/%m/%Y',
-                'target_date_format': '%d-%m-%Y'
+                'target_date_format': '%d-%m-%Y',
+                'optimize': 'image'
             }
         ]
     }
 ]
 
-async def download_file(client, message, target_filename, file_type, timeout=600):
+def media_id(message):
+    """Return the Telegram id of a message's document or photo."""
+    media = getattr(message, 'document', None) or getattr(message, 'photo', None)
+    return getattr(media, 'id', None)
+
+
+def load_download_manifest(path=download_manifest_file):
+    """Load the record of which Telegram file each target path was downloaded from."""
+    return load_json(path, 'download manifest')
+
+
+def save_download_manifest(manifest, path=download_manifest_file):
+    """Write the download manifest atomically."""
+    save_json_atomic(manifest, path, 'download manifest')
+
+
+download_manifest = load_download_manifest()
+
+
+async def download_message(client, message, part_path, offset=0, progress_callback=None, checkpoint=None):
+    """
+    Download a message's media into part_path, resuming at offset when possible.
+
+    Large documents use the parallel engine. Other documents, and the
+    fallback after a parallel failure, stream with iter_download, which can
+    also start at offset. Photos are always downloaded whole.
+    """
+    size = message.file.size or 0
+    document = getattr(message, 'document', None)
+    completed = {'offset': offset}
+
+    def track(done):
+        completed['offset'] = done
+        if checkpoint:
+            checkpoint(done)
+
+    if download_engine == 'parallel' and document and size >= parallel_min_size:
+        try:
+            return await download_parallel(
+                client,
+                message,
+                part_path,
+                connections=download_connections,
+                part_size=download_part_size,
+                progress_callback=progress_callback,
+                offset=offset,
+                checkpoint=track
+            )
+        except Exception as e:
+            logger.warning(f"Parallel download failed for {os.path.basename(part_path)}, falling back to a sequential download: {e}")
+
+    if not document:
+        with open(part_path, 'wb') as f:
+            await client.download_media(message, f, progress_callback=progress_callback)
+        return os.path.getsize(part_path)
+
+    # Continue after whatever prefix is complete; only whole 4 KB blocks are
+    # kept so the resumed request stays aligned
+    start = completed['offset'] - completed['offset'] % 4096
+    offset = start
+    with open(part_path, 'r+b' if offset and os.path.exists(part_path) else 'wb') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        async for chunk in client.iter_download(message.media, offset=offset):
+            f.write(chunk)
+            offset += len(chunk)
+            track(offset)
+            if progress_callback:
+                await progress_callback(offset, size)
+    return offset - start
+
+def day_dir(day):
+    """Return the dated folder files for day are saved in."""
+    return os.path.join(base_dir, day.strftime('%d-%m-%Y'))
+
+
+async def download_file(client, message, target_filename, file_type, timeout=600, directory=None):
     try:
         if message.file:
-            save_path = os.path.join(dated_dir, target_filename)
+            save_path = os.path.join(directory or dated_dir, target_filename)
+            part_path = os.path.join(download_cache_dir, f"{target_filename}.part")
+            size = message.file.size
+            file_id = media_id(message)
+            
+            # Skip targets already downloaded from this exact Telegram file
+            manifest_key = os.path.relpath(save_path, base_dir)
+            entry = download_manifest.get(manifest_key)
+            same_file = bool(entry) and entry.get('id') == file_id and entry.get('size') == size
+            if same_file and entry.get('complete') and os.path.isfile(save_path) and os.path.getsize(save_path) == size:
+                logger.info(f"Already downloaded: {target_filename}")
+                metrics.inc('downloads', file_type=file_type, result='skipped')
+                return True
+            
+            # Resume a partial download of the same file, otherwise start again
+            offset = 0
+            if same_file and os.path.isfile(part_path):
+                offset = min(entry.get('offset', 0), os.path.getsize(part_path))
+            entry = {'id': file_id, 'size': size, 'offset': offset, 'complete': False}
+            download_manifest[manifest_key] = entry
+            os.makedirs(download_cache_dir, exist_ok=True)
+            if offset:
+                logger.info(f"Resuming {target_filename} at byte {offset} of {size}")
+            
+            def checkpoint(completed):
+                entry['offset'] = completed
+            
+            # Log each 10% step once; progress arrives in parts, so exact multiples are rarely hit
+            logged = {'step': offset * 10 // size if size else 0}
             
             async def progress_callback(current, total):
-                percentage = (current/total)*100
-                if percentage % 10 == 0:
-                    logger.info(f'Downloaded: {current}/{total} bytes ({percentage:.1f}%)')
+                step = current * 10 // total if total else 10
+                if step > logged['step']:
+                    logged['step'] = step
+                    logger.info(f'Downloaded: {current}/{total} bytes ({current / total * 100:.1f}%)')
             
-            await asyncio.wait_for(
-                client.download_media(
-                    message,
-                    save_path,
-                    progress_callback=progress_callback
-                ),
-                timeout=timeout
-            )
-            logger.info(f"Downloaded: {target_filename}")
+            started = time.monotonic()
+            try:
+                fetched = await asyncio.wait_for(
+                    download_message(client, message, part_path, offset, progress_callback, checkpoint),
+                    timeout=timeout
+                )
+            finally:
+                # Keep the resume point even when the download times out or fails
+                save_download_manifest(download_manifest)
+            
+            if size and os.path.getsize(part_path) != size:
+                raise IOError(f"Expected {size} bytes but {os.path.getsize(part_path)} were written")
+            os.replace(part_path, save_path)
+            entry.update(offset=size, complete=True)
+            save_download_manifest(download_manifest)
+            
+            elapsed = max(time.monotonic() - started, 1e-6)
+            fetched_mb = fetched / 1048576
+            logger.info(f"Downloaded: {target_filename} ({fetched_mb:.1f} MB in {elapsed:.1f}s, {fetched_mb / elapsed:.2f} MB/s)")
+            metrics.inc('downloads', file_type=file_type, result='downloaded')
+            metrics.inc('download_bytes', fetched, file_type=file_type)
+            metrics.observe('download_seconds', elapsed, file_type=file_type)
+            metrics.observe('download_mbps', fetched_mb / elapsed, metrics.MBPS_BUCKETS, file_type=file_type)
             return True
     except TimeoutError:
         logger.error(f"Download timed out for {target_filename}")
     except Exception as e:
         logger.error(f"Error downloading {target_filename}: {e}")
+    metrics.inc('downloads', file_type=file_type, result='failed')
     return False
 
-async def check_highlights_channel(client, channel):
+
+class RateLimiter:
+    """
+    Token bucket shared by every Telegram request of a client.
+
+    Requests take a token each, refilled at `rate` per second up to `burst`.
+    A flood wait pauses only the peer it was raised for. A flood wait on a
+    peerless request pauses every request and halves the rate, which then
+    recovers gradually. `throttled` is the total time callers
+    spent waiting.
+    """
+
+    def __init__(self, rate=rpc_rate, burst=rpc_burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = {}
+        self.throttled = 0.0
+        self.flood_waits = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        # Recover a tenth of the configured rate per second after a flood wait
+        self.rate = min(self.max_rate, self.rate + elapsed * self.max_rate / 10)
+
+    async def acquire(self, key=None):
+        """Wait for a token, and for any flood wait pending on key or on every peer."""
+        while True:
+            pause = max(self.paused_until.get(key, 0), self.paused_until.get(None, 0)) - time.monotonic()
+            if pause <= 0:
+                async with self._lock:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    pause = (1 - self.tokens) / self.rate
+            self.throttled += pause
+            await asyncio.sleep(pause)
+
+    async def wait_paused(self, key):
+        """Wait out a flood wait pending on key, without taking a token."""
+        pause = self.paused_until.get(key, 0) - time.monotonic()
+        if pause > 0:
+            self.throttled += pause
+            await asyncio.sleep(pause)
+
+    def flood_wait(self, key, seconds):
+        """Pause requests for key; None pauses every peer and also halves the rate."""
+        self.flood_waits += 1
+        metrics.observe('telegram_flood_wait_seconds', seconds)
+        self.paused_until[key] = max(self.paused_until.get(key, 0), time.monotonic() + seconds)
+        if key is None:
+            self.rate = max(self.max_rate / 8, self.rate / 2)
+
+
+# RateLimiter key under which flood waits on file parts are tracked
+FILE_PARTS = 'file_parts'
+
+
+def request_peer_key(request):
+    """Return the peer id a Telegram request targets, or None for peerless requests."""
+    peer = getattr(request, 'peer', None) or getattr(request, 'channel', None)
+    if peer is None:
+        return None
+    try:
+        return utils.get_peer_id(peer)
+    except Exception:
+        return str(peer)
+
+
+class RateLimitedTelegramClient(TelegramClient):
+    """
+    TelegramClient whose requests all pass through one RateLimiter.
+
+    File parts are not throttled. Flood waits are handled here rather than by
+    Telethon's global sleep, so a flood wait on one channel does not stall the others.
+    Flood waits on file parts pause every file part (under FILE_PARTS), without
+    slowing other requests down.
+    """
+
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        kwargs.setdefault('flood_sleep_threshold', 0)
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # Channel names by peer id, for labelling request metrics
+        self.peer_names = {}
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        if isinstance(request, GetFileRequest):
+            while True:
+                # The client-wide flood_sleep_threshold is 0, so file flood waits are waited out here
+                await self.rate_limiter.wait_paused(FILE_PARTS)
+                metrics.inc('telegram_file_requests')
+                try:
+                    return await super()._call(sender, request, ordered, flood_sleep_threshold)
+                except FloodWaitError as e:
+                    if e.seconds > max_flood_wait:
+                        raise
+                    self._flood_waited_requests.pop(GetFileRequest.CONSTRUCTOR_ID, None)
+                    logger.warning(f"Flood wait of {e.seconds}s on file downloads")
+                    self.rate_limiter.flood_wait(FILE_PARTS, e.seconds)
+
+        key = request_peer_key(request)
+        while True:
+            await self.rate_limiter.acquire(key)
+            metrics.inc('telegram_rpcs', method=type(request).__name__,
+                        channel=self.peer_names.get(key, 'none' if key is None else str(key)))
+            try:
+                return await super()._call(sender, request, ordered, flood_sleep_threshold)
+            except FloodWaitError as e:
+                if e.seconds > max_flood_wait:
+                    raise
+                # Telethon remembers flood waits per request type; the pause is tracked per peer here instead
+                self._flood_waited_requests.pop(getattr(request, 'CONSTRUCTOR_ID', None), None)
+                logger.warning(f"Flood wait of {e.seconds}s on {key if key is not None else 'all requests'}")
+                self.rate_limiter.flood_wait(key, e.seconds)
+
+
+class DownloadScheduler:
+    """
+    Bounded download queue shared by all channel scans.
+
+    Scans submit matched messages and wait for the result; a fixed pool of
+    workers performs the downloads, and each channel is limited to a number
+    of downloads in flight so one busy channel cannot take every worker.
+    on_download, if given, is called with the target file name after each
+    successful download submitted with notify=True.
+    """
+
+    def __init__(self, client, workers=download_workers, per_channel=channel_download_limit, on_download=None):
+        self.client = client
+        self.workers = max(1, workers)
+        self.per_channel = max(1, per_channel)
+        self.on_download = on_download
+        self.queue = asyncio.Queue(maxsize=self.workers * 2)
+        self._channel_limits = {}
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, channel, message, target_filename, file_type, directory=None, notify=True):
+        """Queue a download and wait until a worker has finished it."""
+        limit = self._channel_limits.setdefault(channel['username'], asyncio.Semaphore(self.per_channel))
+        async with limit:
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((message, target_filename, file_type, directory, notify, future))
+            return await future
+
+    async def _worker(self):
+        while True:
+            message, target_filename, file_type, directory, notify, future = await self.queue.get()
+            try:
+                if future.done():
+                    continue  # The submitting scan was cancelled (e.g. channel timeout)
+                success = await download_file(self.client, message, target_filename, file_type, directory=directory)
+                if success and notify and self.on_download:
+                    self.on_download(target_filename)
+                if not future.done():
+                    future.set_result(success)
+            except Exception as e:
+                logger.error(f"Download worker failed on {target_filename}: {e}")
+                if not future.done():
+                    future.set_result(False)
+            finally:
+                self.queue.task_done()
+
+
+async def fetch(client, channel, message, target_filename, file_type, scheduler=None, directory=None, notify=True):
+    """Download through the scheduler when one is running, otherwise directly."""
+    if scheduler:
+        return await scheduler.submit(channel, message, target_filename, file_type, directory, notify)
+    return await download_file(client, message, target_filename, file_type, directory=directory)
+
+
+def album_filename(target_filename, number):
+    """Return the target file name of page number (from 1) of an album."""
+    stem, extension = os.path.splitext(target_filename)
+    return f"{stem}_{number}{extension}"
+
+
+def stitched_filename(target_filename):
+    """
+    Return the name of the PDF an album's pages are stitched into; it is kept
+    apart from the newspaper PDFs, which have the same stem.
+    """
+    return os.path.splitext(target_filename)[0] + '_highlights.pdf'
+
+
+def target_downloaded(channel, directory, target_filename):
+    """
+    Whether a channel's target is already in directory; highlights count as
+    downloaded as an image, as album pages or as a stitched PDF.
+    """
+    names = [target_filename]
+    if channel['type'] == 'highlights':
+        names += [album_filename(target_filename, 1), stitched_filename(target_filename)]
+    return any(os.path.isfile(os.path.join(directory, name)) for name in names)
+
+
+async def album_messages(client, channel, message):
+    """
+    Return the media messages of the album a message belongs to, in posting order.
+
+    Albums hold at most 10 messages with consecutive ids, so the neighbours
+    of the matched message are fetched in one request. A message that isn't
+    part of an album is returned on its own.
+    """
+    if not message.grouped_id:
+        return [message]
+    ids = list(range(message.id - 9, message.id + 10))
+    nearby = await client.get_messages(channel_peer(channel), ids=ids)
+    album = [item for item in nearby if item and item.grouped_id == message.grouped_id and item.media]
+    return sorted(album, key=lambda item: item.id) or [message]
+
+
+async def fetch_highlights(client, channel, message, target_filename, scheduler=None, directory=None):
+    """
+    Download a matched highlights post, with every page of its album.
+
+    A single image is saved as target_filename. The pages of an album are
+    downloaded concurrently as <target>_1.jpg, <target>_2.jpg, ... and, with
+    HIGHLIGHTS_PDF=1, stitched into one PDF that replaces them.
+
+    Returns:
+        True if every page was downloaded
+    """
+    album = await album_messages(client, channel, message)
+    if len(album) == 1:
+        return await fetch(client, channel, message, target_filename, 'highlights', scheduler, directory)
+
+    logger.info(f"{target_filename} was posted as an album of {len(album)} pages")
+    names = [album_filename(target_filename, number) for number in range(1, len(album) + 1)]
+    # Pages about to be stitched aren't announced; the PDF is, once written
+    stitch = highlights_pdf and Image is not None
+    results = await asyncio.gather(*(
+        fetch(client, channel, page, name, 'highlights', scheduler, directory, notify=not stitch)
+        for page, name in zip(album, names)
+    ))
+    if not all(results):
+        logger.error(f"Downloaded {sum(results)} of the {len(album)} pages of {target_filename}")
+        return False
+
+    if highlights_pdf and not stitch:
+        logger.warning(f"Pillow is required to stitch {target_filename} into a PDF; keeping its pages")
+    if not stitch:
+        return True
+
+    directory = directory or dated_dir
+    pdf_filename = stitched_filename(target_filename)
+    page_paths = [os.path.join(directory, name) for name in names]
+    try:
+        await asyncio.to_thread(stitch_images, page_paths, os.path.join(directory, pdf_filename))
+    except Exception as e:
+        logger.error(f"Failed to stitch the pages of {target_filename}, keeping them: {e}")
+        announced = names
+    else:
+        for path in page_paths:
+            os.remove(path)
+        logger.info(f"Stitched {len(album)} pages into {pdf_filename}")
+        announced = [pdf_filename]
+    if scheduler and scheduler.on_download:
+        for name in announced:
+            scheduler.on_download(name)
+    return True
+
+
+async def check_highlights_channel(client, channel, scheduler=None, state=None):
     try:
         today = datetime.now()
+        cursor = channel_cursor(state, channel) if state is not None else None
+        pending = []
         for pattern in channel['patterns']:
-            # Try with the original date format first
-            date_str = today.strftime(pattern['date_format'])
-            expected_text = pattern['text_pattern'].format(date=date_str)
-            target_filename = pattern['target_format'].format(
-                date=today.strftime(pattern['target_date_format'])
-            )
-            
-            logger.info(f"Checking {channel['username']} for: {expected_text}")
-            found = False
-            
-            async for message in client.iter_messages(channel['username'], limit=50):
-                if message.text and expected_text in message.text and message.media:
-                    success = await download_file(client, message, target_filename, 'highlights')
-                    if success:
-                        found = True
-                        break
-                await asyncio.sleep(0.5)
-            
-            # If not found, try alternative date formats (removing leading zeros)
-            if not found and '/' in pattern['date_format']:
-                # Generate all possible date format variations
-                alt_date_formats = []
-                
-                # Original format (e.g., "02/05/2025")
-                orig_date = today.strftime(pattern['date_format'])
-                parts = orig_date.split('/')
-                
-                if len(parts) > 1:
-                    # Format 1: Day without leading zero (e.g., "2/05/2025")
-                    if parts[0].startswith('0'):
-                        new_parts = parts.copy()
-                        new_parts[0] = parts[0][1:]
-                        alt_date_formats.append('/'.join(new_parts))
-                    
-                    # Format 2: Month without leading zero (e.g., "02/5/2025")
-                    if len(parts) > 1 and parts[1].startswith('0'):
-                        new_parts = parts.copy()
-                        new_parts[1] = parts[1][1:]
-                        alt_date_formats.append('/'.join(new_parts))
-                    
-                    # Format 3: Both day and month without leading zeros (e.g., "2/5/2025")
-                    if parts[0].startswith('0') and parts[1].startswith('0'):
-                        new_parts = parts.copy()
-                        new_parts[0] = parts[0][1:]
-                        new_parts[1] = parts[1][1:]
-                        alt_date_formats.append('/'.join(new_parts))
-                
-                # Try each alternative date format
-                for alt_date in alt_date_formats:
-                    alt_expected_text = pattern['text_pattern'].format(date=alt_date)
-                    logger.info(f"Retrying with alternative date format: {alt_expected_text}")
-                    
-                    found_with_alt = False
-                    async for message in client.iter_messages(channel['username'], limit=50):
-                        if message.text and alt_expected_text in message.text and message.media:
-                            success = await download_file(client, message, target_filename, 'highlights')
+            target_filename = target_filename_for(pattern, today)
+            if os.path.isfile(os.path.join(dated_dir, stitched_filename(target_filename))):
+                logger.info(f"Already stitched: {stitched_filename(target_filename)}")
+                continue
+            matcher = compile_matcher(pattern['text_pattern'], pattern['date_format'], today.date())
+            logger.info(f"Checking {channel['username']} for: {pattern['text_pattern'].format(date=today.strftime(pattern['date_format']))}")
+            pending.append((matcher, target_filename))
+        if not pending:
+            return
+
+        async def try_messages(messages):
+            for message in messages:
+                if message.text and message.media:
+                    for matcher, target_filename in list(pending):
+                        if matcher.search(message.text):
+                            record_match(cursor, target_filename, message)
+                            success = await fetch_highlights(client, channel, message, target_filename, scheduler)
+                            metrics.inc('match_attempts', strategy='text', result='downloaded' if success else 'failed')
                             if success:
-                                found_with_alt = True
-                                found = True
-                                break
-                        await asyncio.sleep(0.5)
-                    
-                    if found_with_alt:
-                        break
+                                pending.remove((matcher, target_filename))
+                if not pending:
+                    return
+
+        # Posts matched earlier today are fetched again by id in one request
+        if cursor:
+            known_ids = sorted({message_id for ids in cursor['matches'].values() for message_id in ids}, reverse=True)
+            if known_ids:
+                await try_messages([message for message in await client.get_messages(channel_peer(channel), ids=known_ids)
+                                    if message])
+
+        # Ask Telegram for the photos captioned like each pattern first
+        cutoff = scan_cutoff(today)
+        if server_search and pending:
+            found = await search_channel(client, channel, [pattern['text_pattern'] for pattern in channel['patterns']],
+                                         InputMessagesFilterPhotos(), cutoff=cutoff)
+            await try_messages(found)
+
+        # One pass over today's messages newer than the cursor, testing every pattern still missing against each post
+        if pending:
+            min_id = cursor['last_id'] if cursor else 0
+            newest_id = min_id
+            async for message in client.iter_messages(channel_peer(channel), limit=max_scan_messages, min_id=min_id):
+                newest_id = max(newest_id, message.id)
+                if message.date < cutoff:
+                    break
+                metrics.inc('messages_scanned', channel=channel['username'])
+                await try_messages([message])
+                if not pending:
+                    break
+            if cursor:
+                cursor['last_id'] = newest_id
+
+        for _, target_filename in pending:
+            logger.info(f"No highlights found in {channel['username']} for {target_filename}")
     except Exception as e:
         logger.error(f"Error checking highlights in {channel['username']}: {e}")
+        forget_peer(channel, e)
+
+
+def normalize_filename(name):
+    """Lowercase a file name and collapse whitespace for comparisons."""
+    return ' '.join(name.lower().split())
+
 
-async def check_newspaper_channel(client, channel):
+def extract_date_tokens(name):
+    """Return the numeric tokens of a file name with leading zeros stripped."""
+    return tuple(str(int(token)) for token in re.findall(r'\d+', name))
+
+
+def compile_date_pattern(date_format, day):
+    """
+    Translate a strftime date format into a regex for one day.
+
+    Day and month accept an optional leading zero, so '%d~%m~%Y' for 4 May 2025
+    matches '04~05~2025', '4~05~2025', '04~5~2025' and '4~5~2025'.
+    """
+    fields = {
+        'd': lambda: f"0?{day.day}" if day.day < 10 else str(day.day),
+        'm': lambda: f"0?{day.month}" if day.month < 10 else str(day.month),
+        'Y': lambda: str(day.year),
+        'y': lambda: day.strftime('%y'),
+        'b': lambda: day.strftime('%b'),
+        'B': lambda: day.strftime('%B'),
+    }
+    pattern = []
+    i = 0
+    while i < len(date_format):
+        if date_format[i] == '%' and i + 1 < len(date_format):
+            directive = date_format[i + 1]
+            pattern.append(fields[directive]() if directive in fields else re.escape(day.strftime(f'%{directive}')))
+            i += 2
+        else:
+            pattern.append(re.escape(date_format[i]))
+            i += 1
+    return ''.join(pattern)
+
+
+def _flexible_spacing(text):
+    """Escape text so any run of whitespace in it matches any run of whitespace."""
+    return r'\s+'.join(re.escape(word) for word in text.split())
+
+
+@functools.lru_cache(maxsize=None)
+def compile_matcher(template, date_format, day):
+    """
+    Compile a source_format or text_pattern into one case-insensitive regex.
+
+    The regex accepts every date-padding variant and optional spacing around
+    the date (e.g. 'TH Delhi 4--5.pdf' and 'TH Delhi04--05.pdf'). Use
+    fullmatch() for file names and search() for message text.
+
+    Args:
+        template: Format string with a single {date} placeholder
+        date_format: strftime format of the date inside the template
+        day: datetime.date to match
+
+    Returns:
+        Compiled regex
+    """
+    before, placeholder, after = template.partition('{date}')
+    parts = [_flexible_spacing(before)]
+    if placeholder:
+        parts.append(r'\s*' + compile_date_pattern(date_format, day) + r'\s*')
+    parts.append(_flexible_spacing(after))
+    return re.compile(''.join(parts), re.IGNORECASE)
+
+
+def load_scan_state(path=scan_state_file):
+    """Load the per-channel scan cursors saved by previous runs."""
+    return load_json(path, 'scan state')
+
+
+def save_scan_state(state, path=scan_state_file):
+    """Write the scan cursors atomically so an interrupted run cannot corrupt them."""
+    save_json_atomic(state, path, 'scan state')
+
+
+# Errors that mean a cached peer no longer gives access to its channel
+ACCESS_ERRORS = (ChannelInvalidError, ChannelPrivateError, ChatIdInvalidError, InviteHashExpiredError, PeerIdInvalidError)
+
+PEER_TYPES = {cls.__name__: cls for cls in (InputPeerChannel, InputPeerChat, InputPeerUser)}
+
+
+def load_peer_cache(path=peer_cache_file):
+    """Load the peers resolved by previous runs."""
+    return load_json(path, 'peer cache')
+
+
+def save_peer_cache(cache, path=peer_cache_file):
+    """Write the peer cache atomically."""
+    save_json_atomic(cache, path, 'peer cache')
+
+
+peer_cache = load_peer_cache()
+
+
+def cached_peer(channel):
+    """Return the cached input peer of a configured channel, or None."""
+    entry = peer_cache.get(channel['username'])
+    if not entry or entry.get('type') not in PEER_TYPES:
+        return None
+    fields = {key: value for key, value in entry.items() if key not in ('type', 'peer_id', 'member')}
+    try:
+        return PEER_TYPES[entry['type']](**fields)
+    except TypeError:
+        return None
+
+
+def channel_peer(channel):
+    """Return what to pass to the client for a channel: its cached peer, or its username."""
+    return cached_peer(channel) or channel['username']
+
+
+def remember_peer(channel, entity, member=None):
+    """
+    Cache the input peer (id and access hash) of a channel the account can read.
+
+    member records whether the account has joined the channel; None keeps
+    what was recorded before (False for a channel that was only resolved).
+    """
+    try:
+        peer = utils.get_input_peer(entity)
+    except TypeError:
+        return
+    fields = peer.to_dict()
+    peer_type = fields.pop('_')
+    if peer_type not in PEER_TYPES:
+        return
+    if member is None:
+        member = peer_cache.get(channel['username'], {}).get('member', False)
+    peer_cache[channel['username']] = {
+        'type': peer_type,
+        'peer_id': utils.get_peer_id(peer),
+        'member': member,
+        **fields
+    }
+    save_peer_cache(peer_cache)
+
+
+def forget_peer(channel, error):
+    """Drop a channel's cached peer after an access error, so the next run resolves (and joins) it again."""
+    if isinstance(error, ACCESS_ERRORS) and peer_cache.pop(channel['username'], None):
+        logger.warning(f"Dropped cached peer of {channel['username']} after an access error: {error}")
+        save_peer_cache(peer_cache)
+
+
+async def resolve_channel(client, channel):
+    """Return a channel's peer, resolving and caching it only if it isn't cached yet."""
+    peer = cached_peer(channel)
+    if peer is None:
+        peer = await client.get_entity(channel['username'])
+        remember_peer(channel, peer)
+    if hasattr(client, 'peer_names'):
+        client.peer_names[utils.get_peer_id(peer)] = channel['username']
+    return peer
+
+
+def day_start(day):
+    """Return local midnight at the start of day as a timezone-aware datetime."""
+    return datetime.combine(day.date(), datetime.min.time()).astimezone()
+
+
+def scan_cutoff(day):
+    """
+    Return the time before which messages are too old to be day's posts.
+
+    The window is measured back from local midnight, so the runner's timezone
+    decides where it starts. The result is timezone-aware, so comparing it
+    with the UTC dates of Telegram messages is always correct.
+    """
+    return day_start(day) - timedelta(hours=scan_window_hours)
+
+
+def channel_cursor(state, channel):
+    """
+    Return the cursor for a channel, dropping matches recorded for another day.
+
+    A cursor holds the highest message id already scanned ('last_id') and the
+    message ids matched for today's targets ('matches', target name -> ids).
+    """
+    cursor = state.setdefault(channel['username'], {'last_id': 0, 'date': today_str, 'matches': {}})
+    if cursor.get('date') != today_str:
+        cursor['date'] = today_str
+        cursor['matches'] = {}
+    return cursor
+
+
+def record_match(cursor, target_filename, message):
+    """Remember a message matched for a target so re-runs can fetch it by id."""
+    if cursor is not None:
+        ids = cursor['matches'].setdefault(target_filename, [])
+        if message.id not in ids:
+            ids.append(message.id)
+
+
+def add_to_index(index, message):
+    """Add a message to a channel index if it carries a named file."""
+    if not message.file or not getattr(message.file, 'name', None):
+        return
+
+    entry = {
+        'message': message,
+        'name': message.file.name,
+        'normalized': normalize_filename(message.file.name),
+        'date_tokens': extract_date_tokens(message.file.name)
+    }
+    index['entries'].append(entry)
+
+
+def search_query(template):
+    """
+    Return the words of a source_format or text_pattern before its {date}, as a
+    Telegram search query (e.g. 'INDIAN EXPRESS HD Delhi').
+    """
+    before, _, after = template.partition('{date}')
+    words = re.findall(r'[\w#-]+', before) or re.findall(r'[\w#-]+', os.path.splitext(after)[0])
+    return ' '.join(words)
+
+
+async def search_channel(client, channel, templates, message_filter, limit=search_limit, cutoff=None):
+    """
+    Look up a channel's posts with Telegram's message search.
+
+    Runs one search per distinct query, restricted to message_filter (documents
+    or photos), so only a handful of candidate messages are transferred
+    instead of whole pages of history. Search failures are logged and treated
+    as no results, leaving the caller to fall back to a history scan.
+
+    Args:
+        client: Connected TelegramClient
+        channel: Channel configuration entry
+        templates: source_format or text_pattern values to search for
+        message_filter: InputMessagesFilter* instance
+        limit: Maximum number of results per search
+        cutoff: Optional time before which results are ignored (see scan_cutoff)
+
+    Returns:
+        The messages found, newest first, without duplicates
+    """
+    found = {}
+    for query in dict.fromkeys(search_query(template) for template in templates):
+        try:
+            async for message in client.iter_messages(channel_peer(channel), limit=limit, search=query, filter=message_filter):
+                if cutoff and message.date < cutoff:
+                    break
+                found.setdefault(message.id, message)
+        except Exception as e:
+            logger.warning(f"Search for '{query}' in {channel['username']} failed: {e}")
+            forget_peer(channel, e)
+    messages = sorted(found.values(), key=lambda message: message.id, reverse=True)
+    metrics.inc('messages_scanned', len(messages), channel=channel['username'])
+    metrics.inc('message_searches', channel=channel['username'], result='found' if messages else 'empty')
+    logger.info(f"Search found {len(messages)} candidate messages in {channel['username']}")
+    return messages
+
+
+async def build_channel_index(client, channel, limit=max_scan_messages, cursor=None, cutoff=None):
+    """
+    Fetch a channel's recent history once and index its documents.
+
+    The history is read newest first until a message older than cutoff, or
+    until limit messages have been read.
+
+    With a cursor, only messages newer than its 'last_id' are fetched, plus
+    the messages it matched earlier today (fetched by id in one request), and
+    the cursor is advanced to the newest message seen.
+
+    Args:
+        client: Connected TelegramClient
+        channel: Channel configuration entry
+        limit: Maximum number of messages to fetch
+        cursor: Optional scan cursor from channel_cursor()
+        cutoff: Optional time to stop at (see scan_cutoff)
+
+    Returns:
+        Dict with the number of messages scanned ('count') and the indexed
+        documents, newest first, with their normalized names and date
+        tokens ('entries')
+    """
+    index = {'count': 0, 'entries': []}
+    min_id = cursor['last_id'] if cursor else 0
+    newest_id = min_id
+
+    async for message in client.iter_messages(channel_peer(channel), limit=limit, min_id=min_id):
+        newest_id = max(newest_id, message.id)
+        if cutoff and message.date < cutoff:
+            break
+        index['count'] += 1
+        add_to_index(index, message)
+
+    if cursor:
+        known_ids = sorted({message_id for ids in cursor['matches'].values() for message_id in ids}, reverse=True)
+        if known_ids:
+            for message in await client.get_messages(channel_peer(channel), ids=known_ids):
+                if message:
+                    add_to_index(index, message)
+        cursor['last_id'] = newest_id
+
+    metrics.inc('messages_scanned', index['count'], channel=channel['username'])
+    logger.info(f"Indexed {len(index['entries'])} documents from {index['count']} messages in {channel['username']}"
+                + (f" (newer than message {min_id})" if min_id else ""))
+    return index
+
+
+def channel_file_confs(channel):
+    """Return a newspaper channel's file configurations."""
+    file_confs = channel.get('files')
+    if not file_confs:
+        # Support single-file config for backward compatibility
+        file_confs = [{
+            'source_format': channel['source_format'],
+            'target_format': channel['target_format'],
+            'date_format': channel['date_format'],
+            'target_date_format': channel['target_date_format'],
+            'optimize': channel.get('optimize')
+        }]
+    return file_confs
+
+
+def channel_confs(channel):
+    """Return a channel's file configurations, or its patterns for a highlights channel."""
+    return channel['patterns'] if channel['type'] == 'highlights' else channel_file_confs(channel)
+
+
+def target_filename_for(conf, day):
+    """Format the target file name of a file configuration or highlights pattern."""
+    return conf['target_format'].format(date=day.strftime(conf['target_date_format']))
+
+
+def channel_targets(channel, day):
+    """Return the target file names a channel is scanned for on day."""
+    return [target_filename_for(conf, day) for conf in channel_confs(channel)]
+
+
+def match_channel(index, channel, file_confs, today):
+    """
+    Resolve every file configuration against a channel index in one pass.
+
+    Each indexed document is tested against the compiled matcher of every
+    file configuration. Private channels additionally collect flexible
+    (all keywords and date components) and loose (publication keywords and
+    any date component) candidates, which are only tried after the matcher hits.
+
+    Returns:
+        One list of (strategy, message) candidates per file configuration,
+        in priority order
+    """
+    is_private = channel['username'].startswith('https://t.me/+')
+    plans = []
+    for file_conf in file_confs:
+        source_date = today.strftime(file_conf['date_format'])
+        source_filename = file_conf['source_format'].format(date=source_date)
+        plans.append({
+            'matcher': compile_matcher(file_conf['source_format'], file_conf['date_format'], today.date()),
+            'exact': normalize_filename(source_filename),
+            'keywords': [part for part in source_filename.lower().replace('.pdf', '').split() if len(part) > 1],
+            'key_parts': [key for key in ('hindu', 'upsc', 'express') if key in source_filename.lower()],
+            'date_tokens': set(extract_date_tokens(source_date)),
+            'matched': [],
+            'flexible': [],
+            'loose': []
+        })
+
+    for entry in index['entries']:
+        for plan in plans:
+            if plan['matcher'].fullmatch(entry['name']):
+                strategy = 'exact' if entry['normalized'] == plan['exact'] else 'alternate'
+                plan['matched'].append((strategy, entry['message']))
+                continue
+
+            if not is_private:
+                continue
+
+            if all(part in entry['normalized'] for part in plan['keywords']):
+                if plan['date_tokens'].issubset(entry['date_tokens']):
+                    plan['flexible'].append(('flexible', entry['message']))
+                    continue
+                logger.info(f"Found partial match (keywords match but date doesn't): {entry['name']}")
+
+            if (all(part in entry['normalized'] for part in plan['key_parts'])
+                    and plan['date_tokens'].intersection(entry['date_tokens'])
+                    and entry['normalized'].endswith('.pdf')):
+                plan['loose'].append(('loose', entry['message']))
+
+    # Exact hits first, then the fuzzier strategies in the order they used to be tried.
+    # A document the matcher assigned to one file is never a fuzzy candidate for another.
+    claimed = {message.id for plan in plans for _, message in plan['matched']}
+    return [
+        sorted(plan['matched'], key=lambda candidate: candidate[0] != 'exact')
+        + [candidate for candidate in plan['flexible'] + plan['loose'] if candidate[1].id not in claimed]
+        for plan in plans
+    ]
+
+
+async def check_newspaper_channel(client, channel, scheduler=None, state=None):
     try:
         today = datetime.now()
-        found_any = False
-        file_confs = channel.get('files')
-        if not file_confs:
-            # Support single-file config for backward compatibility
-            file_confs = [{
-                'source_format': channel['source_format'],
-                'target_format': channel['target_format'],
-                'date_format': channel['date_format'],
-                'target_date_format': channel['target_date_format']
-            }]
-        
-        # Initialize an empty file_list for all channels
-        file_list = []
-        
-        # For private channels with invite links, verify access
-        if channel['username'].startswith('https://t.me/+'):
+        file_confs = channel_file_confs(channel)
+
+        cursor = channel_cursor(state, channel) if state is not None else None
+        cutoff = scan_cutoff(today)
+
+        # Ask Telegram for documents named like each file first; loose matches
+        # don't count as found, since a scan may still turn up a better one
+        matches = [[] for _ in file_confs]
+        if server_search:
+            found = await search_channel(client, channel, [conf['source_format'] for conf in file_confs],
+                                         InputMessagesFilterDocument(), cutoff=cutoff)
+            index = {'count': len(found), 'entries': []}
+            for message in found:
+                add_to_index(index, message)
+            matches = match_channel(index, channel, file_confs, today)
+        missing = [i for i, candidates in enumerate(matches)
+                   if not any(strategy != 'loose' for strategy, _ in candidates)]
+
+        # Fetch the channel history once and resolve every file the search missed against it
+        if missing:
             try:
-                logger.info(f"Verifying access to private channel {channel['username']}")
-                messages = []
-                
-                async for msg in client.iter_messages(channel['username'], limit=200):
-                    messages.append(msg)
-                    if msg.file and hasattr(msg.file, 'name') and msg.file.name:
-                        file_list.append(msg.file.name)
-                
-                if not messages:
-                    logger.warning(f"Could access the channel {channel['username']} but no messages found")
-                    return False
-                else:
-                    logger.info(f"Successfully accessed private channel {channel['username']}")
+                index = await build_channel_index(client, channel, cursor=cursor, cutoff=cutoff)
             except Exception as channel_access_err:
-                logger.error(f"Failed to access private channel {channel['username']}: {channel_access_err}")
-                return False
-                
-        for file_conf in file_confs:
-            source_date = today.strftime(file_conf['date_format'])
-            target_date = today.strftime(file_conf['target_date_format'])
-            source_filename = file_conf['source_format'].format(date=source_date)
-            target_filename = file_conf['target_format'].format(date=target_date)
-            
-            # Special handling for The Hindu to try both with and without space
-            alternate_source_filename = None
-            if '@the_hindu_newspaper_free_pdf' in channel['username']:
-                if ' {date}' in file_conf['source_format']:
-                    # Create alternate filename without space
-                    alternate_format = file_conf['source_format'].replace(' {date}', '{date}')
-                    alternate_source_filename = alternate_format.format(date=source_date)
-                elif '{date}' in file_conf['source_format']:
-                    # Create alternate filename with space
-                    alternate_format = file_conf['source_format'].replace('{date}', ' {date}')
-                    alternate_source_filename = alternate_format.format(date=source_date)
-            
-            # Check if the file we're looking for is in the file_list already found
-            if file_list and any(f.lower() == source_filename.lower() for f in file_list):
-                logger.info(f"The file {source_filename} was found in the initial channel scan. Attempting direct download...")
-                # Try to find the message with this file and download it
-                try:
-                    found_file = False
-                    async for msg in client.iter_messages(channel['username'], limit=100):
-                        if msg.file and hasattr(msg.file, 'name') and msg.file.name and msg.file.name.lower() == source_filename.lower():
-                            logger.info(f"Found the exact file in channel: {msg.file.name}")
-                            success = await download_file(client, msg, target_filename, 'newspaper')
-                            if success:
-                                found_any = True
-                                found_file = True
-                                break
-                    
-                    if found_file:
-                        logger.info(f"Successfully downloaded {source_filename} directly")
-                        continue  # Skip to next file
-                except Exception as direct_err:
-                    logger.error(f"Error attempting direct download of {source_filename}: {direct_err}")
-            
+                logger.error(f"Failed to access channel {channel['username']}: {channel_access_err}")
+                forget_peer(channel, channel_access_err)
+                index = {'count': 0, 'entries': []}
+
+            if not index['count'] and not index['entries']:
+                if cursor and cursor['last_id']:
+                    logger.info(f"No new messages in {channel['username']} since message {cursor['last_id']}")
+                else:
+                    logger.warning(f"Could access the channel {channel['username']} but no messages found")
+            else:
+                scanned = match_channel(index, channel, [file_confs[i] for i in missing], today)
+                for i, candidates in zip(missing, scanned):
+                    seen = {message.id for _, message in candidates}
+                    matches[i] = candidates + [candidate for candidate in matches[i] if candidate[1].id not in seen]
+
+        async def fetch_file_conf(file_conf, candidates):
+            source_filename = file_conf['source_format'].format(date=today.strftime(file_conf['date_format']))
+            target_filename = target_filename_for(file_conf, today)
             logger.info(f"Checking {channel['username']} for: {source_filename}")
-            if alternate_source_filename:
-                logger.info(f"Will also check alternative format: {alternate_source_filename}")
-                
-            found_file = False
-            
-            # Implement manual pagination to check more messages
-            offset_id = 0
-            message_count = 0
-            max_messages = 200  # Check up to 200 messages
-            
-            while message_count < max_messages:
-                messages = await client.get_messages(channel['username'], limit=50, offset_id=offset_id)
-                if not messages:
-                    logger.info(f"No more messages found after checking {message_count} messages")
-                    break
-                
-                for message in messages:
-                    message_count += 1
-                    
-                    # Skip messages without files
-                    if not message.file:
-                        continue
-                        
-                    # Skip files without name attribute
-                    if not hasattr(message.file, 'name') or not message.file.name:
-                        continue
-                        
-                    # Check for primary format match
-                    if message.file.name.lower() == source_filename.lower():
-                        logger.info(f"Found file with primary format: {message.file.name}")
-                        success = await download_file(client, message, target_filename, 'newspaper')
-                        if success:
-                            found_any = True
-                            found_file = True
-                            break
-                    
-                    # Check for alternate format match if available
-                    if alternate_source_filename and message.file.name.lower() == alternate_source_filename.lower():
-                        logger.info(f"Found file with alternate format: {message.file.name}")
-                        success = await download_file(client, message, target_filename, 'newspaper')
-                        if success:
-                            found_any = True
-                            found_file = True
-                            break
-                    
-                    # For private channels, try a more flexible matching approach
-                    if channel['username'].startswith('https://t.me/+'):
-                        # Check if filename contains the essential components (exact match failed)
-                        filename_parts = source_filename.lower().replace('.pdf', '').split()
-                        file_name_lower = message.file.name.lower()
-                        
-                        # Check if all important parts are in the filename (like "HINDU", "UPSC", "HD", etc.)
-                        all_parts_match = all(part in file_name_lower for part in filename_parts if len(part) > 1)
-                        
-                        # Check for date components in the filename
-                        date_parts = source_date.split('~')
-                        date_matches = all(date_part in file_name_lower for date_part in date_parts)
-                        
-                        if all_parts_match and date_matches:
-                            logger.info(f"Found file with flexible matching: {message.file.name}")
-                            logger.info(f"  - Looking for: {source_filename}")
-                            success = await download_file(client, message, target_filename, 'newspaper')
-                            if success:
-                                found_any = True
-                                found_file = True
-                                break
-                        elif all_parts_match:  # Log partial matches for debugging
-                            logger.info(f"Found partial match (keywords match but date doesn't): {message.file.name}")
-                        
-                if found_file:
-                    break
-                        
-                # Update offset_id for pagination if messages exist
-                if messages:
-                    offset_id = messages[-1].id
-                
-                await asyncio.sleep(0.5)
-            
-            # If the file was not found with the original date format, try alternative formats
-            if not found_file:
-                alt_date_formats = []
-                
-                # Handle tilde format (dd~mm~yyyy)
-                if '~' in file_conf['date_format']:
-                    # Parse the original date
-                    parts = source_date.split('~')
-                    if len(parts) >= 3:
-                        # Format 1: Day without leading zero
-                        if parts[0].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[0] = parts[0][1:]  # Remove leading zero from day
-                            alt_date_formats.append('~'.join(new_parts))
-                        
-                        # Format 2: Month without leading zero
-                        if parts[1].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[1] = parts[1][1:]  # Remove leading zero from month
-                            alt_date_formats.append('~'.join(new_parts))
-                        
-                        # Format 3: Both day and month without leading zeros
-                        if parts[0].startswith('0') and parts[1].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[0] = parts[0][1:]  # Remove leading zero from day
-                            new_parts[1] = parts[1][1:]  # Remove leading zero from month
-                            alt_date_formats.append('~'.join(new_parts))
-                
-                # Handle double-hyphen format (dd--mm)
-                elif '--' in file_conf['date_format']:
-                    # Parse the original date
-                    parts = source_date.split('--')
-                    if len(parts) >= 2:
-                        # Format 1: Day without leading zero
-                        if parts[0].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[0] = parts[0][1:]  # Remove leading zero from day
-                            alt_date_formats.append('--'.join(new_parts))
-                        
-                        # Format 2: Month without leading zero
-                        if parts[1].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[1] = parts[1][1:]  # Remove leading zero from month
-                            alt_date_formats.append('--'.join(new_parts))
-                        
-                        # Format 3: Both day and month without leading zeros
-                        if parts[0].startswith('0') and parts[1].startswith('0'):
-                            new_parts = parts.copy()
-                            new_parts[0] = parts[0][1:]  # Remove leading zero from day
-                            new_parts[1] = parts[1][1:]  # Remove leading zero from month
-                            alt_date_formats.append('--'.join(new_parts))
-                
-                # Try each alternative date format
-                for alt_date in alt_date_formats:
-                    alt_source_filename = file_conf['source_format'].format(date=alt_date)
-                    logger.info(f"Trying alternative date format: {alt_source_filename}")
-                    
-                    async for message in client.iter_messages(channel['username'], limit=50):
-                        if (message.file and 
-                            hasattr(message.file, 'name') and 
-                            message.file.name and
-                            message.file.name.lower() == alt_source_filename.lower()):
-                            
-                            logger.info(f"Found file with alternative date format: {message.file.name}")
-                            success = await download_file(client, message, target_filename, 'newspaper')
-                            if success:
-                                found_any = True
-                                found_file = True
-                                break
-                        await asyncio.sleep(0.5)
-                    
-                    if found_file:
-                        break
-            
-            if not found_file:
-                logger.info(f"File not found in {channel['username']} with any date format: {source_filename}")
-                if alternate_source_filename:
-                    logger.info(f"Also tried alternate format: {alternate_source_filename}")
-                
-                # Last resort: try a very loose match for private channels (just look for Hindu + UPSC + date)
-                if not found_file and channel['username'].startswith('https://t.me/+'):
-                    logger.info(f"Trying last resort loose matching for {channel['username']}")
-                    
-                    # Extract key keywords from filename
-                    key_parts = []
-                    if "HINDU" in source_filename.upper():
-                        key_parts.append("hindu")
-                    if "UPSC" in source_filename.upper():
-                        key_parts.append("upsc")
-                    if "EXPRESS" in source_filename.upper():
-                        key_parts.append("express")
-                        
-                    # Get just the date digits
-                    date_digits = []
-                    for part in source_date.split('~'):
-                        if part.isdigit():
-                            date_digits.append(part.lstrip('0') if part.startswith('0') else part)
-                    
-                    logger.info(f"Looking for loose match with keywords: {key_parts} and date digits: {date_digits}")
-                    
-                    # Manual pagination for last resort search
-                    offset_id = 0
-                    message_count = 0
-                    max_messages = 100  # Check up to 100 messages
-                    
-                    while message_count < max_messages and not found_file:
-                        messages = await client.get_messages(channel['username'], limit=50, offset_id=offset_id)
-                        if not messages:
-                            logger.info(f"No more messages found during last resort search after checking {message_count} messages")
-                            break
-                        
-                        for message in messages:
-                            message_count += 1
-                            
-                            # Skip messages without files or without name attribute
-                            if not message.file or not hasattr(message.file, 'name') or not message.file.name:
-                                continue
-                                
-                            file_name_lower = message.file.name.lower()
-                            
-                            # Must match all key parts (publication name, edition)
-                            if all(part in file_name_lower for part in key_parts):
-                                # Must match at least one date part
-                                date_match = any(digit in file_name_lower for digit in date_digits if len(digit) > 0)
-                                
-                                if date_match and file_name_lower.endswith('.pdf'):
-                                    logger.info(f"Found file with very loose matching: {message.file.name}")
-                                    success = await download_file(client, message, target_filename, 'newspaper')
-                                    if success:
-                                        found_any = True
-                                        found_file = True
-                                        break
-                        
-                        if found_file:
-                            break
-                            
-                        # Update offset_id for pagination if messages exist
-                        if messages:
-                            offset_id = messages[-1].id
-                        
-                        await asyncio.sleep(0.5)
-                    
-        return found_any
+
+            for strategy, message in candidates:
+                logger.info(f"Found file with {strategy} matching: {message.file.name}")
+                record_match(cursor, target_filename, message)
+                success = await fetch(client, channel, message, target_filename, 'newspaper', scheduler)
+                metrics.inc('match_attempts', strategy=strategy, result='downloaded' if success else 'failed')
+                if success:
+                    return True
+
+            logger.info(f"File not found in {channel['username']} with any date format: {source_filename}")
+            return False
+
+        # Every edition is independent, so resolve and download them concurrently
+        results = await asyncio.gather(*(
+            fetch_file_conf(file_conf, candidates) for file_conf, candidates in zip(file_confs, matches)
+        ))
+        return any(results)
     except Exception as e:
         logger.error(f"Error checking {channel['username']}: {e}")
         return False
@@ -520,6 +1149,9 @@ async def join_private_channels(client):
     """Joins private channels using their invite links before attempting to download"""
     for channel in channels:
         if channel['username'].startswith('https://t.me/+'):
+            if peer_cache.get(channel['username'], {}).get('member'):
+                logger.info(f"Already a member of private channel: {channel['username']}")
+                continue
             try:
                 logger.info(f"Attempting to join private channel: {channel['username']}")
                 # Extract the hash from the invite link
@@ -527,13 +1159,22 @@ async def join_private_channels(client):
                 
                 # Try to join using ImportChatInviteRequest
                 try:
-                    await client(ImportChatInviteRequest(channel_hash))
+                    result = await client(ImportChatInviteRequest(channel_hash))
+                    for chat in getattr(result, 'chats', None) or []:
+                        remember_peer(channel, chat, member=True)
                     logger.info(f"Successfully joined private channel: {channel['username']}")
+                except UserAlreadyParticipantError:
+                    # Nothing to join or wait for; just cache the channel
+                    remember_peer(channel, await resolve_channel(client, channel), member=True)
+                    logger.info(f"Already a member of private channel: {channel['username']}")
+                    continue
                 except Exception as invite_err:
                     logger.warning(f"Couldn't join using invite hash, trying direct URL: {invite_err}")
                     # Try to join using the full URL as a fallback
                     try:
-                        await client(JoinChannelRequest(channel['username']))
+                        result = await client(JoinChannelRequest(channel['username']))
+                        for chat in getattr(result, 'chats', None) or []:
+                            remember_peer(channel, chat, member=True)
                         logger.info(f"Successfully joined private channel: {channel['username']}")
                     except Exception as url_err:
                         logger.error(f"Failed to join using full URL: {url_err}")
@@ -544,51 +1185,359 @@ async def join_private_channels(client):
             except Exception as e:
                 logger.error(f"Failed to join private channel {channel['username']}: {e}")
 
-async def main():
+async def join_public_channel(client, channel, entity):
+    """
+    Join a public channel the account isn't a member of yet.
+
+    Telegram only pushes new posts of joined channels, so watch mode joins
+    each public channel it watches. Membership is cached like that of
+    private channels.
+    """
+    if peer_cache.get(channel['username'], {}).get('member'):
+        return
+    try:
+        await client(JoinChannelRequest(entity))
+        remember_peer(channel, entity, member=True)
+        logger.info(f"Joined channel {channel['username']} to receive its new posts")
+    except UserAlreadyParticipantError:
+        remember_peer(channel, entity, member=True)
+    except Exception as e:
+        logger.warning(f"Failed to join {channel['username']}; its new posts may not arrive: {e}")
+
+async def process_channel(client, channel, scheduler=None, state=None):
+    """Verify access to a channel and run its scan within channel_timeout."""
     try:
-        # Try getting session string from environment variable (for remote execution)
-        session_string = os.environ.get('TELEGRAM_SESSION_STRING')
+        try:
+            # Resolve the channel once; later runs use the cached peer without a request
+            await resolve_channel(client, channel)
+            logger.info(f"Successfully verified access to channel: {channel['username']}")
+        except Exception as access_err:
+            logger.error(f"Failed to verify access to channel {channel['username']}: {access_err}")
         
-        if session_string:
-            # Remote execution using session string
-            client = TelegramClient(StringSession(session_string), api_id, api_hash)
+        if channel['type'] == 'highlights':
+            await asyncio.wait_for(check_highlights_channel(client, channel, scheduler, state), timeout=channel_timeout)
         else:
-            # Local execution using file-based session
-            client = TelegramClient('news_session', api_id, api_hash)
-        
-        async with client:
+            await asyncio.wait_for(check_newspaper_channel(client, channel, scheduler, state), timeout=channel_timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout checking {channel['username']}")
+
+async def watch_channels(client, scheduler=None, state=None, timeout=watch_timeout):
+    """
+    Download today's targets as soon as they are posted instead of scanning history.
+
+    Registers an events.NewMessage handler for every channel that still has
+    a missing target, matches each incoming post with the same matchers as
+    the scans, and returns once every target is in dated_dir or timeout
+    seconds have passed. Watched public channels are joined first, since
+    Telegram only sends updates for joined channels. Run a scan beforehand
+    for targets posted before watching starts.
+    """
+    today = datetime.now()
+    pending = {}
+    by_chat = {}
+    for channel in channels:
+        confs = [conf for conf in channel_confs(channel) if not target_downloaded(channel, dated_dir, target_filename_for(conf, today))]
+        if not confs:
+            continue
+        try:
+            entity = await resolve_channel(client, channel)
+        except Exception as access_err:
+            logger.error(f"Failed to verify access to channel {channel['username']}: {access_err}")
+            continue
+        if not channel['username'].startswith('https://t.me/+'):
+            await join_public_channel(client, channel, entity)
+        by_chat[utils.get_peer_id(entity)] = (channel, entity)
+        pending[channel['username']] = confs
+
+    if not pending:
+        logger.info("All of today's targets are already downloaded")
+        return
+
+    done = asyncio.Event()
+
+    async def on_new_message(event):
+        channel, _ = by_chat.get(event.chat_id, (None, None))
+        confs = pending.get(channel['username']) if channel else None
+        if not confs:
+            return
+
+        message = event.message
+        metrics.inc('messages_scanned', channel=channel['username'])
+        if channel['type'] == 'highlights':
+            file_type = 'highlights'
+            hits = [
+                (conf, [('text', message)]) for conf in list(confs)
+                if message.text and message.media
+                and compile_matcher(conf['text_pattern'], conf['date_format'], today.date()).search(message.text)
+            ]
+        else:
+            file_type = 'newspaper'
+            index = {'count': 1, 'entries': []}
+            add_to_index(index, message)
+            # Loose matches are a last resort after a full scan; a live post may still be followed by a better one
+            hits = [(conf, [candidate for candidate in candidates if candidate[0] != 'loose'])
+                    for conf, candidates in zip(list(confs), match_channel(index, channel, list(confs), today))]
+
+        cursor = channel_cursor(state, channel) if state is not None else None
+        for conf, candidates in hits:
+            target_filename = target_filename_for(conf, today)
+            for strategy, candidate in candidates:
+                logger.info(f"New post in {channel['username']} matches {target_filename} ({strategy})")
+                record_match(cursor, target_filename, candidate)
+                if file_type == 'highlights':
+                    success = await fetch_highlights(client, channel, candidate, target_filename, scheduler)
+                else:
+                    success = await fetch(client, channel, candidate, target_filename, file_type, scheduler)
+                metrics.inc('match_attempts', strategy=strategy, result='downloaded' if success else 'failed')
+                if success:
+                    if conf in confs:
+                        confs.remove(conf)
+                    break
+
+        if cursor:
+            cursor['last_id'] = max(cursor['last_id'], message.id)
+            save_scan_state(state)
+        if not any(pending.values()):
+            done.set()
+
+    remaining = sum(len(confs) for confs in pending.values())
+    logger.info(f"Watching {len(pending)} channels for {remaining} remaining targets")
+    client.add_event_handler(on_new_message, events.NewMessage(chats=[entity for _, entity in by_chat.values()]))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=timeout)
+        logger.info("All of today's targets have been downloaded")
+    except asyncio.TimeoutError:
+        for username, confs in pending.items():
+            for conf in confs:
+                logger.warning(f"Stopped watching {username} without {target_filename_for(conf, today)}")
+    finally:
+        client.remove_event_handler(on_new_message)
+
+def date_range(start, end):
+    """Return every day from start to end, inclusive, as datetimes."""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+async def backfill_channel(client, channel, days, scheduler=None):
+    """
+    Download a channel's targets for several days from one sweep of its history.
+
+    The history is read once, newest first, from the end of the last day back
+    to the scan_cutoff() of the first, and every day's targets are matched
+    against it. Targets already in their dated folder are skipped.
+
+    Args:
+        client: Connected TelegramClient
+        channel: Channel configuration entry
+        days: Days to download, as datetimes
+        scheduler: Optional DownloadScheduler to download through
+
+    Returns:
+        Number of targets downloaded
+    """
+    highlights = channel['type'] == 'highlights'
+    confs = channel_confs(channel)
+    wanted = [
+        (day, conf) for day in days for conf in confs
+        if not target_downloaded(channel, day_dir(day), target_filename_for(conf, day))
+    ]
+    if not wanted:
+        logger.info(f"All targets of {channel['username']} for the backfill range are already downloaded")
+        return 0
+
+    first_day = min(day for day, _ in wanted)
+    last_day = max(day for day, _ in wanted)
+    offset_date = day_start(last_day + timedelta(days=1))
+    cutoff = scan_cutoff(first_day)
+
+    index = {'count': 0, 'entries': []}
+    posts = []
+    try:
+        async for message in client.iter_messages(channel_peer(channel), limit=backfill_max_messages, offset_date=offset_date):
+            if message.date < cutoff:
+                break
+            index['count'] += 1
+            if highlights:
+                if message.text and message.media:
+                    posts.append(message)
+            else:
+                add_to_index(index, message)
+    except Exception as e:
+        logger.error(f"Failed to read the history of {channel['username']}: {e}")
+        forget_peer(channel, e)
+        return 0
+    metrics.inc('messages_scanned', index['count'], channel=channel['username'])
+    logger.info(f"Read {index['count']} messages of {channel['username']} back to {cutoff:%d-%m-%Y %H:%M}")
+
+    def candidates_for(day, day_confs):
+        if highlights:
+            return [
+                [('text', message) for message in posts
+                 if compile_matcher(conf['text_pattern'], conf['date_format'], day.date()).search(message.text)]
+                for conf in day_confs
+            ]
+        return match_channel(index, channel, day_confs, day)
+
+    async def fetch_target(day, conf, candidates):
+        target_filename = target_filename_for(conf, day)
+        for strategy, message in candidates:
+            logger.info(f"Backfill: {target_filename} matches {strategy}")
+            if highlights:
+                success = await fetch_highlights(client, channel, message, target_filename, scheduler, day_dir(day))
+            else:
+                success = await fetch(client, channel, message, target_filename, 'newspaper', scheduler, day_dir(day))
+            metrics.inc('match_attempts', strategy=strategy, result='downloaded' if success else 'failed')
+            if success:
+                return True
+        logger.info(f"Backfill: no {target_filename} found in {channel['username']}")
+        return False
+
+    # The sweep holds several days' editions, but match_channel only keeps the
+    # documents matched for the day it is given out of the fuzzy candidates. Every
+    # document the matcher assigns to a day of the sweep (including the days either
+    # side of the range) is therefore excluded from the other days' flexible
+    # candidates. Loose candidates are dropped, since a shared year satisfies them.
+    claimed = set()
+    if not highlights:
+        for day in date_range(first_day - timedelta(days=1), last_day + timedelta(days=1)):
+            for candidates in match_channel(index, channel, confs, day):
+                claimed.update(message.id for strategy, message in candidates if strategy in ('exact', 'alternate'))
+
+    def usable(strategy, message):
+        if strategy == 'loose':
+            return False
+        return strategy != 'flexible' or message.id not in claimed
+
+    jobs = []
+    for day in sorted({day for day, _ in wanted}):
+        os.makedirs(day_dir(day), exist_ok=True)
+        day_confs = [conf for wanted_day, conf in wanted if wanted_day == day]
+        for conf, candidates in zip(day_confs, candidates_for(day, day_confs)):
+            candidates = [(strategy, message) for strategy, message in candidates if usable(strategy, message)]
+            jobs.append(fetch_target(day, conf, candidates))
+    results = await asyncio.gather(*jobs)
+    return sum(results)
+
+
+async def backfill(client, start, end):
+    """
+    Download every channel's targets for each day from start to end, inclusive.
+
+    Each channel's history is swept once for the whole range, and all
+    matches are downloaded through one DownloadScheduler.
+
+    Args:
+        client: Connected RateLimitedTelegramClient
+        start: First day, as a datetime
+        end: Last day, as a datetime
+    """
+    days = date_range(start, end)
+    logger.info(f"Backfilling {len(days)} days from {start:%d-%m-%Y} to {end:%d-%m-%Y}")
+    await join_private_channels(client)
+
+    scheduler = DownloadScheduler(client)
+    scheduler.start()
+    try:
+        results = await asyncio.gather(*(backfill_channel(client, channel, days, scheduler) for channel in channels))
+    finally:
+        await scheduler.close()
+    logger.info(f"Backfill downloaded {sum(results)} files")
+
+
+def create_client():
+    """Create the rate-limited client from TELEGRAM_SESSION_STRING, or the local session file."""
+    # Try getting session string from environment variable (for remote execution)
+    session_string = os.environ.get('TELEGRAM_SESSION_STRING')
+    
+    if session_string:
+        # Remote execution using session string
+        return RateLimitedTelegramClient(StringSession(session_string), api_id, api_hash)
+    # Local execution using file-based session
+    return RateLimitedTelegramClient('news_session', api_id, api_hash)
+
+async def download_all(client, watch=False, on_download=None, on_channel_done=None):
+    """
+    Download today's targets from every channel with a connected client.
+
+    Args:
+        client: Connected RateLimitedTelegramClient
+        watch: Wait for new posts instead of scanning history
+        on_download: Optional callable(target_filename) run after each successful download
+        on_channel_done: Optional callable(channel) run once a channel will download nothing more
+    """
+    # Join any private channels first
+    await join_private_channels(client)
+    
+    async def scan(channel):
+        try:
+            await process_channel(client, channel, scheduler, state)
+        finally:
+            if on_channel_done:
+                on_channel_done(channel)
+    
+    # Scan every channel concurrently (or wait for new posts in watch mode),
+    # feeding matches into one download queue
+    state = load_scan_state()
+    scheduler = DownloadScheduler(client, on_download=on_download)
+    scheduler.start()
+    try:
+        if watch:
+            # Targets posted before the watch started only turn up in history
+            await asyncio.gather(*(process_channel(client, channel, scheduler, state) for channel in channels))
+            save_scan_state(state)
+            await watch_channels(client, scheduler, state)
+            if on_channel_done:
+                for channel in channels:
+                    on_channel_done(channel)
+        else:
+            await asyncio.gather(*(scan(channel) for channel in channels))
+    finally:
+        await scheduler.close()
+        save_scan_state(state)
+    
+    logger.info("All channels checked")
+    logger.info(f"Spent {client.rate_limiter.throttled:.1f}s throttled "
+                f"({client.rate_limiter.flood_waits} flood waits)")
+    metrics.set_gauge('telegram_throttled_seconds', client.rate_limiter.throttled)
+    metrics.set_gauge('telegram_flood_waits', client.rate_limiter.flood_waits)
+
+async def main(watch=False, backfill_range=None):
+    try:
+        async with create_client() as client:
             logger.info("Starting Telegram client...")
             me = await client.get_me()
             logger.info(f"Successfully connected as {me.username}")
             
-            # Join any private channels first
-            await join_private_channels(client)
-            
-            # Verify channel access
-            for channel in channels:
-                try:
-                    channel_entity = None
-                    try:
-                        # Try to get the channel entity to verify access
-                        channel_entity = await client.get_entity(channel['username'])
-                        logger.info(f"Successfully verified access to channel: {channel['username']}")
-                    except Exception as access_err:
-                        logger.error(f"Failed to verify access to channel {channel['username']}: {access_err}")
-                    
-                    if channel['type'] == 'highlights':
-                        await asyncio.wait_for(check_highlights_channel(client, channel), timeout=300)
-                    else:
-                        await asyncio.wait_for(check_newspaper_channel(client, channel), timeout=300)
-                except asyncio.TimeoutError:
-                    logger.error(f"Timeout checking {channel['username']}")
-            
-            logger.info("All channels checked")
+            if backfill_range:
+                await backfill(client, *backfill_range)
+            else:
+                await download_all(client, watch)
         
     except Exception as e:
         logger.error(f"Error in main: {e}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download today's newspapers from Telegram")
+    parser.add_argument('--watch', action='store_true',
+                        help="stay connected and download today's files as soon as they are posted")
+    parser.add_argument('--backfill', nargs='+', metavar='DD-MM-YYYY',
+                        help="download the files of every day from the first date to the second (default: today) instead")
+    args = parser.parse_args()
+    backfill_range = None
+    if args.backfill:
+        if len(args.backfill) > 2:
+            parser.error("--backfill takes a start date and an optional end date")
+        try:
+            backfill_range = [datetime.strptime(value, '%d-%m-%Y') for value in args.backfill]
+        except ValueError as e:
+            parser.error(f"invalid --backfill date: {e}")
+        if len(backfill_range) == 1:
+            backfill_range.append(datetime.now())
+        if backfill_range[0].date() > backfill_range[1].date():
+            parser.error("--backfill start date is after the end date")
     try:
-        asyncio.run(main())
+        asyncio.run(main(watch=args.watch, backfill_range=backfill_range))
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
+    finally:
+        metrics.write_report('telegram_downloader')
@@ -0,0 +1,77 @@
+from datetime import date
+import os
+import re
+import tempfile
+
+import pytest
+
+# Importing the downloader creates today's dated folder; keep it out of the working tree
+os.environ['GITHUB_WORKSPACE'] = tempfile.mkdtemp(prefix='news_test_')
+
+from telegram_downloader import compile_date_pattern, compile_matcher
+
+MAY_4 = date(2025, 5, 4)
+
+# The "Supported File Formats" table in the README:
+# (template, date_format, day, accepted names, rejected names)
+FORMATS = [
+    ('INDIAN EXPRESS HD Delhi {date}.pdf', '%d~%m~%Y', MAY_4,
+     ['INDIAN EXPRESS HD Delhi 04~05~2025.pdf', 'indian express hd delhi 4~5~2025.pdf'],
+     ['INDIAN EXPRESS HD Delhi 14~05~2025.pdf']),
+    ('INDIAN EXPRESS UPSC IAS EDITION HD {date}.pdf', '%d~%m~%Y', MAY_4,
+     ['INDIAN EXPRESS UPSC IAS EDITION HD 4~05~2025.pdf'],
+     ['INDIAN EXPRESS UPSC IAS EDITION HD 04~05~2024.pdf']),
+    ('THE HINDU UPSC IAS EDITION HD {date}.pdf', '%d~%m~%Y', MAY_4,
+     ['THE HINDU UPSC IAS EDITION HD 04~5~2025.pdf'],
+     ['THE HINDU UPSC IAS EDITION HD 04~05~2025 (1).pdf']),
+    ('TH Delhi {date}.pdf', '%d--%m', MAY_4,
+     ['TH Delhi 4--5.pdf', 'TH Delhi04--05.pdf'],
+     ['TH Delhi 4--15.pdf']),
+]
+
+# Highlights captions are searched for inside the message text
+CAPTIONS = [
+    ('#ToBeReadVajiram in The Hindu: {date}', '%d/%m/%Y', MAY_4,
+     ['#ToBeReadVajiram in The Hindu: 4/5/2025'],
+     ['#ToBeReadVajiram in The Hindu: 04/05/2024']),
+]
+
+
+def cases(table, accepted):
+    return [
+        pytest.param(template, date_format, day, name, id=name)
+        for template, date_format, day, accepts, rejects in table
+        for name in (accepts if accepted else rejects)
+    ]
+
+
+@pytest.mark.parametrize('template, date_format, day, name', cases(FORMATS, True))
+def test_file_name_accepted(template, date_format, day, name):
+    assert compile_matcher(template, date_format, day).fullmatch(name)
+
+
+@pytest.mark.parametrize('template, date_format, day, name', cases(FORMATS, False))
+def test_file_name_rejected(template, date_format, day, name):
+    assert not compile_matcher(template, date_format, day).fullmatch(name)
+
+
+@pytest.mark.parametrize('template, date_format, day, text', cases(CAPTIONS, True))
+def test_caption_accepted(template, date_format, day, text):
+    assert compile_matcher(template, date_format, day).search(text)
+
+
+@pytest.mark.parametrize('template, date_format, day, text', cases(CAPTIONS, False))
+def test_caption_rejected(template, date_format, day, text):
+    assert not compile_matcher(template, date_format, day).search(text)
+
+
+@pytest.mark.parametrize('date_format, accepted, rejected', [
+    ('%d~%m~%Y', ['04~05~2025', '4~05~2025', '04~5~2025', '4~5~2025'], ['004~05~2025', '4~5~25']),
+    ('%d--%m', ['04--05', '4--5'], ['14--05', '4--15']),
+])
+def test_date_pattern_padding(date_format, accepted, rejected):
+    pattern = re.compile(compile_date_pattern(date_format, MAY_4))
+    for text in accepted:
+        assert pattern.fullmatch(text), text
+    for text in rejected:
+        assert not pattern.fullmatch(text), text